@@ -1,6 +1,8 @@
-import requests
 import json
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from kivy.app import App
 from kivy.uix.boxlayout import BoxLayout
@@ -12,14 +14,24 @@ from kivy.uix.button import Button
 from kivy.uix.popup import Popup
 from kivy.uix.switch import Switch
 from kivy.uix.slider import Slider
-from kivy.uix.scrollview import ScrollView
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
+from kivy.uix.recycleboxlayout import RecycleBoxLayout
 from kivy.uix.accordion import Accordion, AccordionItem
 from kivy.clock import Clock
 from kivy.metrics import dp
+from kivy.properties import BooleanProperty, ListProperty, NumericProperty, ObjectProperty, StringProperty
 from kivy.graphics import Color, RoundedRectangle
 from kivy.core.window import Window
 from kivy.utils import platform
 
+# cheap parts only; networking (requests) and sqlite are imported when first needed,
+# so the first frame does not wait for them
+from steam_core import Catalog, atomic_write, normalize_name
+
+# seconds between two compactions of the favorites history
+HISTORY_COMPACT_INTERVAL = 60 * 60
+
 
 class RoundedButton(Button):
     def __init__(self, **kwargs):
@@ -36,6 +48,113 @@ class RoundedButton(Button):
             RoundedRectangle(pos=self.pos, size=self.size, radius=[dp(10)])
 
 
+class BackgroundWorker:
+    # runs blocking calls (network, parsing) on a small thread pool and hands the results
+    # back on the kivy thread through Clock. jobs belong to a group ('search', 'favorites'...),
+    # cancelling a group drops its queued jobs and ignores results of the ones already running
+
+    def __init__(self, max_workers=4):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='steam-worker')
+        self.generations = {}
+        self.futures = {}
+
+    def generation(self, group):
+        return self.generations.get(group, 0)
+
+    def submit(self, group, fn, *args, on_done=None, on_error=None):
+        generation = self.generation(group)
+
+        def finished(future):
+            if not future.cancelled():
+                Clock.schedule_once(lambda dt: self.deliver(group, generation, future, on_done, on_error))
+
+        future = self.pool.submit(fn, *args)
+        self.futures.setdefault(group, set()).add(future)
+        future.add_done_callback(finished)
+        return future
+
+    def deliver(self, group, generation, future, on_done, on_error):
+        # runs on the kivy thread
+        self.futures.get(group, set()).discard(future)
+        if generation != self.generation(group):
+            return
+        error = future.exception()
+        if error is not None:
+            if on_error is not None:
+                on_error(error)
+        elif on_done is not None:
+            on_done(future.result())
+
+    def post(self, group, generation, callback):
+        # from a worker thread: run callback() on the kivy thread unless the group was cancelled since
+        Clock.schedule_once(lambda dt: callback() if generation == self.generation(group) else None)
+
+    def cancel(self, group):
+        self.generations[group] = self.generation(group) + 1
+        for future in self.futures.pop(group, ()):
+            future.cancel()
+
+    def cancel_all(self):
+        for group in list(self.futures):
+            self.cancel(group)
+
+    def shutdown(self):
+        self.cancel_all()
+        self.pool.shutdown(wait=False)
+
+
+class SettingsStore:
+    # the settings dict and the json file behind it. save() only marks the settings as
+    # changed; the file is written once changes stop for `delay` seconds, on the worker
+    # pool, through a temp file and a rename so a crash mid-write leaves the old file intact
+
+    def __init__(self, path, defaults, worker, delay=1.0):
+        self.path = path
+        self.worker = worker
+        self.data = self.load(defaults)
+        self.version = 0
+        self.saved_version = 0
+        self.write_lock = threading.Lock()
+        self.flush_trigger = Clock.create_trigger(lambda dt: self.flush_in_background(), delay)
+
+    def load(self, defaults):
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, 'r') as f:
+                    return json.load(f)
+        except Exception as e:
+            print(f"Error loading settings: {e}")
+        return dict(defaults)
+
+    def save(self):
+        # every call restarts the quiet period, dragging a slider ends in a single write
+        self.version += 1
+        self.flush_trigger.cancel()
+        self.flush_trigger()
+
+    def flush_in_background(self):
+        # the snapshot is taken on the ui thread, only the disk work moves to the pool
+        self.worker.submit('settings', self.write, json.dumps(self.data), self.version)
+
+    def flush(self):
+        # write pending changes right now, used when the app is paused or stopped
+        self.flush_trigger.cancel()
+        if self.version != self.saved_version:
+            self.write(json.dumps(self.data), self.version)
+
+    def write(self, text, version):
+        with self.write_lock:
+            # an older snapshot finishing late must not overwrite a newer one
+            if version <= self.saved_version:
+                return
+            try:
+                atomic_write(self.path, text)
+            except OSError as e:
+                print(f"Error saving settings: {e}")
+                return
+            self.saved_version = version
+
+
 class ThemeManager:
     # define color schemes for dark and light themes
     THEMES = {
@@ -135,48 +254,159 @@ class SettingsPopup(Popup):
         self.main_app.save_settings()
 
 
-class GameCard(BoxLayout):
-    def __init__(self, game_name, player_count, on_favorite=None, is_favorite=False, **kwargs):
-        super().__init__(orientation='horizontal', size_hint_y=None, height=dp(80),
-                         spacing=dp(10), padding=[dp(15), dp(10)], **kwargs)
+class RecycleList(RecycleView):
+    # a data driven list: only the rows on screen exist and they are reused while scrolling.
+    # every entry is a dict of row properties with a 'key'; changing an entry rebinds the
+    # visible rows instead of building new widgets, so updates cost the same for 5 or 500 entries
+
+    def __init__(self, row_height, on_select=None, **kwargs):
+        super().__init__(**kwargs)
+        self.on_select = on_select
+        self.rows_by_key = {}
+        # a burst of updates (a favorites refresh) redraws the rows once per frame
+        self.refresh_trigger = Clock.create_trigger(lambda dt: self.refresh_from_data())
+        layout = RecycleBoxLayout(orientation='vertical', size_hint_y=None, spacing=dp(5),
+                                  default_size=(None, row_height), default_size_hint=(1, None))
+        layout.bind(minimum_height=layout.setter('height'))
+        self.add_widget(layout)
+
+    def set_rows(self, rows):
+        self.rows_by_key = {row['key']: row for row in rows if row.get('key') is not None}
+        self.data = rows
+
+    def update_row(self, key, **changes):
+        row = self.rows_by_key.get(key)
+        if row is None:
+            return
+        row.update(changes)
+        self.refresh_trigger()
+
+    def select(self, key):
+        if key is not None and self.on_select is not None:
+            self.on_select(key)
+
+
+class ListRow(RecycleDataViewBehavior, Button):
+    # recycled row of the favorites and history lists
+    key = ObjectProperty(None, allownone=True)
+    owner = None
+
+    def __init__(self, **kwargs):
+        super().__init__(halign='left', valign='middle', **kwargs)
+        self.bind(size=lambda *args: setattr(self, 'text_size', (self.width - dp(20), None)))
+
+    def refresh_view_attrs(self, rv, index, data):
+        self.owner = rv
+        return super().refresh_view_attrs(rv, index, data)
+
+    def on_press(self):
+        if self.owner is not None:
+            self.owner.select(self.key)
+
+
+class MessageRow(RecycleDataViewBehavior, Label):
+    # plain text entry, e.g. "No favorites yet" or a search status
+    key = ObjectProperty(None, allownone=True)
+
+    def __init__(self, **kwargs):
+        super().__init__(font_size=dp(14), halign='center', valign='middle', **kwargs)
+        self.bind(size=lambda *args: setattr(self, 'text_size', (self.width - dp(20), None)))
+
+
+class GameCard(RecycleDataViewBehavior, BoxLayout):
+    # search result row, built once and re-pointed at whatever result it shows
+    key = ObjectProperty(None, allownone=True)
+    game_name = StringProperty('')
+    player_count = NumericProperty(0)
+    is_favorite = BooleanProperty(False)
+    card_color = ListProperty([0.15, 0.15, 0.15, 1])
+    owner = None
+
+    def __init__(self, **kwargs):
+        super().__init__(orientation='horizontal', spacing=dp(10), padding=[dp(15), dp(10)],
+                         **kwargs)
+
+        # rounded background in the theme's card color
+        with self.canvas.before:
+            self.bg_color = Color(*self.card_color)
+            self.rect = RoundedRectangle(pos=self.pos, size=self.size, radius=[dp(10)])
+        self.bind(pos=self.update_card_bg, size=self.update_card_bg)
 
         # game name and player count info
         info_layout = BoxLayout(orientation='vertical', size_hint_x=0.8)
 
-        name_label = Label(text=game_name, font_size=dp(16), halign='left',
-                           text_size=(None, None), bold=True)
-        name_label.bind(texture_size=name_label.setter('text_size'))
+        self.name_label = Label(font_size=dp(16), halign='left', text_size=(None, None), bold=True)
+        self.name_label.bind(texture_size=self.name_label.setter('text_size'))
 
-        count_label = Label(text=f"{player_count:,} players", font_size=dp(14),
-                            halign='left', color=(0.7, 0.7, 0.7, 1))
+        self.count_label = Label(font_size=dp(14), halign='left', color=(0.7, 0.7, 0.7, 1))
 
-        info_layout.add_widget(name_label)
-        info_layout.add_widget(count_label)
+        info_layout.add_widget(self.name_label)
+        info_layout.add_widget(self.count_label)
         self.add_widget(info_layout)
 
         # favorite star button
-        fav_btn = Button(text="★" if is_favorite else "☆", size_hint_x=0.2,
-                         font_size=dp(20), background_color=(0, 0, 0, 0))
-        if on_favorite:
-            fav_btn.bind(on_press=lambda x: on_favorite(game_name))
-        self.add_widget(fav_btn)
+        self.fav_btn = Button(size_hint_x=0.2, font_size=dp(20), background_color=(0, 0, 0, 0))
+        self.fav_btn.bind(on_press=lambda x: self.owner.select(self.key) if self.owner else None)
+        self.add_widget(self.fav_btn)
+
+        self.bind(game_name=self.update_labels, player_count=self.update_labels,
+                  is_favorite=self.update_labels, card_color=self.update_labels)
+
+    def refresh_view_attrs(self, rv, index, data):
+        self.owner = rv
+        return super().refresh_view_attrs(rv, index, data)
+
+    def update_labels(self, *args):
+        self.name_label.text = self.game_name
+        self.count_label.text = f"{self.player_count:,} players"
+        self.fav_btn.text = "★" if self.is_favorite else "☆"
+        self.bg_color.rgba = self.card_color
+
+    def update_card_bg(self, *args):
+        # update card background when size changes
+        self.rect.pos = self.pos
+        self.rect.size = self.size
 
 
 class SteamApp(FloatLayout):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.theme_manager = ThemeManager()
-        self.settings = self.load_settings()
-        self.apps = []
+        self.worker = BackgroundWorker()
+        self.settings_store = SettingsStore(
+            os.path.join(self.get_app_data_path(), 'steam_app_settings.json'),
+            {'theme': 'dark', 'sound_enabled': True, 'auto_refresh': 0,
+             'favorites': [], 'search_history': []},
+            self.worker)
+        self.settings = self.settings_store.data
+        self.catalog = Catalog()
         self.favorites = set(self.settings.get('favorites', []))
+        # last known player count of every favorite
+        self.favorite_counts = {}
+        self.refreshing_favorites = False
         self.search_history = self.settings.get('search_history', [])
         self.auto_refresh_event = None
         self.loading_apps = False
+        # a search started before the game list was ready, run once it is
+        self.pending_search = False
+        self._history = None
+        # monotonic time of the next history.compact(), the first refresh compacts
+        self.next_compact = 0
 
         self.build_ui()
         self.apply_theme()
-        self.load_app_list()
         self.setup_auto_refresh()
+        # after the first frame, the ui shows up and takes input while the list loads
+        Clock.schedule_once(lambda dt: self.load_app_list(), 0)
+
+    @property
+    def history(self):
+        # every favorites refresh is kept as history instead of being thrown away;
+        # opened on first use, sqlite is not needed to show the first frame
+        if self._history is None:
+            from steam_core import HistoryStore
+            self._history = HistoryStore(os.path.join(self.get_app_data_path(), 'history.sqlite'))
+        return self._history
 
     def get_app_data_path(self):
         # get correct path for storing app data on different platforms
@@ -238,29 +468,20 @@ class SteamApp(FloatLayout):
 
         # search results tab
         results_item = AccordionItem(title='Search Results')
-        self.result_scroll = ScrollView()
-        self.result_layout = BoxLayout(orientation='vertical', size_hint_y=None, spacing=dp(5))
-        self.result_layout.bind(minimum_height=self.result_layout.setter('height'))
-        self.result_scroll.add_widget(self.result_layout)
-        results_item.add_widget(self.result_scroll)
+        self.result_list = RecycleList(dp(80), on_select=self.toggle_favorite)
+        results_item.add_widget(self.result_list)
         accordion.add_widget(results_item)
 
         # favorite games tab
         favorites_item = AccordionItem(title='Favorites')
-        self.favorites_scroll = ScrollView()
-        self.favorites_layout = BoxLayout(orientation='vertical', size_hint_y=None, spacing=dp(5))
-        self.favorites_layout.bind(minimum_height=self.favorites_layout.setter('height'))
-        self.favorites_scroll.add_widget(self.favorites_layout)
-        favorites_item.add_widget(self.favorites_scroll)
+        self.favorites_list = RecycleList(dp(50), on_select=self.search_favorite)
+        favorites_item.add_widget(self.favorites_list)
         accordion.add_widget(favorites_item)
 
         # search history tab
         history_item = AccordionItem(title='Recent Searches')
-        self.history_scroll = ScrollView()
-        self.history_layout = BoxLayout(orientation='vertical', size_hint_y=None, spacing=dp(5))
-        self.history_layout.bind(minimum_height=self.history_layout.setter('height'))
-        self.history_scroll.add_widget(self.history_layout)
-        history_item.add_widget(self.history_scroll)
+        self.history_list = RecycleList(dp(50), on_select=self.search_from_history)
+        history_item.add_widget(self.history_list)
         accordion.add_widget(history_item)
 
         main_layout.add_widget(accordion)
@@ -273,29 +494,12 @@ class SteamApp(FloatLayout):
         # change background color based on theme
         Window.clearcolor = self.theme_manager.get_color('bg_color')
 
-    def load_settings(self):
-        # load user settings from file
-        try:
-            settings_path = os.path.join(self.get_app_data_path(), 'steam_app_settings.json')
-            if os.path.exists(settings_path):
-                with open(settings_path, 'r') as f:
-                    return json.load(f)
-        except Exception as e:
-            print(f"Error loading settings: {e}")
-        return {'theme': 'dark', 'sound_enabled': True, 'auto_refresh': 0,
-                'favorites': [], 'search_history': []}
-
     def save_settings(self):
-        # save current settings to file
+        # cheap to call often, the store writes the file once things settle
         self.settings['theme'] = self.theme_manager.current_theme
         self.settings['favorites'] = list(self.favorites)
         self.settings['search_history'] = self.search_history[-20:]  # keep last 20 searches
-        try:
-            settings_path = os.path.join(self.get_app_data_path(), 'steam_app_settings.json')
-            with open(settings_path, 'w') as f:
-                json.dump(self.settings, f)
-        except Exception as e:
-            print(f"Error saving settings: {e}")
+        self.settings_store.save()
 
     def setup_auto_refresh(self):
         # set up automatic refresh for favorites
@@ -320,63 +524,70 @@ class SteamApp(FloatLayout):
     def clear_input(self, instance):
         # clear search input and results
         self.input.text = ""
-        self.result_layout.clear_widgets()
+        self.result_list.set_rows([])
 
     def on_text_change(self, instance, text):
         # placeholder for future search suggestions feature
         pass
 
     def load_app_list(self):
-        # load steam games list in background
-        def load_in_background(dt):
-            if self.loading_apps:
-                return
-
-            self.loading_apps = True
-            try:
-                self.info_label.text = "Loading game database..."
-                url = "https://api.steampowered.com/ISteamApps/GetAppList/v2/"
-                response = requests.get(url, timeout=15)
-                response.raise_for_status()
-                data = response.json()
-
-                if 'applist' in data and 'apps' in data['applist']:
-                    self.apps = data['applist']['apps']
-                    Clock.schedule_once(lambda dt: setattr(self.info_label, 'text',
-                                                           f"Loaded {len(self.apps)} games successfully"))
-                else:
-                    raise Exception("Invalid response format")
-
-            except requests.exceptions.RequestException as e:
-                error_msg = f"Network error: {str(e)[:30]}..."
-                Clock.schedule_once(lambda dt: setattr(self.info_label, 'text', error_msg))
-            except Exception as e:
-                error_msg = f"Error loading games: {str(e)[:30]}..."
-                Clock.schedule_once(lambda dt: setattr(self.info_label, 'text', error_msg))
-            finally:
-                self.loading_apps = False
-
-        Clock.schedule_once(load_in_background, 0.1)
+        # load steam games list on the worker pool, the ui keeps drawing meanwhile
+        if self.loading_apps:
+            return
+        self.loading_apps = True
+        self.info_label.text = "Loading game database..."
+        from steam_core import AppListCache, describe_error
+        # cached next to the settings file, only refetched when steam has a newer list
+        app_list_cache = AppListCache(self.get_app_data_path(), timeout=15)
+        generation = self.worker.generation('catalog')
+
+        def report_loading(loaded, expected):
+            text = f"Loading game database... {loaded // 1000}k / ~{expected // 1000}k"
+            self.worker.post('catalog', generation, lambda: setattr(self.info_label, 'text', text))
+
+        def loaded(catalog):
+            self.loading_apps = False
+            self.catalog = catalog
+            suffix = " (offline copy)" if app_list_cache.source == 'stale' else ""
+            self.info_label.text = f"Loaded {len(catalog)} games successfully{suffix}"
+            if self.pending_search:
+                self.pending_search = False
+                self.get_players(None)
+
+        def failed(e):
+            self.loading_apps = False
+            if self.pending_search:
+                self.pending_search = False
+                self.show_result("Game database could not be loaded")
+            self.info_label.text = f"Error loading games: {describe_error(e)}"
+
+        # parsed and indexed as it streams in, the raw list is never held in memory
+        self.worker.submit('catalog', lambda: app_list_cache.load(on_progress=report_loading),
+                           on_done=loaded, on_error=failed)
 
     def find_appid(self, name):
         # find steam app id by game name
-        if not self.apps:
+        if not self.catalog:
             return None
 
-        name_lower = name.lower().strip()
-        if not name_lower:
+        name_key = normalize_name(name)
+        if not name_key:
             return None
 
         # try exact match first
-        for app in self.apps:
-            if app.get('name', '').lower() == name_lower:
-                return app.get('appid')
-
-        # try partial match if exact not found
-        for app in self.apps:
-            app_name = app.get('name', '').lower()
-            if name_lower in app_name and len(app_name) > 0:
-                return app.get('appid')
+        appid = self.catalog.find_appid(name_key)
+        if appid is not None:
+            return appid
+
+        # try partial match if exact not found, first hit in catalog order
+        found = self.catalog.trigram_index.search(name.strip(), limit=1)
+        if found:
+            return self.catalog.appid(found[0])
+
+        # last resort, closest name allowing for typos
+        fuzzy = self.catalog.search_engine.fuzzy(name, 1)
+        if fuzzy:
+            return self.catalog.appid(fuzzy[0][1])
         return None
 
     def get_players(self, instance):
@@ -386,8 +597,11 @@ class SteamApp(FloatLayout):
             self.show_result("Please enter a game name")
             return
 
-        if not self.apps:
-            self.show_result("Game database not loaded yet. Please wait.")
+        if not self.catalog:
+            # typed while the list is loading, the search runs as soon as it is ready
+            self.pending_search = self.loading_apps
+            self.show_result("Game database is still loading, searching as soon as it is ready..."
+                             if self.loading_apps else "Game database not loaded. Please try again later.")
             return
 
         # add to search history
@@ -401,62 +615,38 @@ class SteamApp(FloatLayout):
             return
 
         self.show_result("Getting player count...")
+        from steam_core import describe_error, get_player_count
 
-        def get_players_background(dt):
-            try:
-                url = f"https://api.steampowered.com/ISteamUserStats/GetNumberOfCurrentPlayers/v1/?appid={appid}"
-                response = requests.get(url, timeout=10)
-                response.raise_for_status()
-                data = response.json()
-
-                if 'response' in data:
-                    player_count = data['response'].get('player_count')
-                    if player_count is not None:
-                        Clock.schedule_once(lambda dt: self.show_game_result(game_name, player_count))
-                        Clock.schedule_once(lambda dt: self.save_settings())
-                    else:
-                        Clock.schedule_once(lambda dt: self.show_result("Player count not available for this game"))
-                else:
-                    Clock.schedule_once(lambda dt: self.show_result("Invalid response from Steam API"))
-
-            except requests.exceptions.RequestException as e:
-                error_msg = f"Network error: {str(e)[:40]}..."
-                Clock.schedule_once(lambda dt: self.show_result(error_msg))
-            except Exception as e:
-                error_msg = f"Error: {str(e)[:50]}..."
-                Clock.schedule_once(lambda dt: self.show_result(error_msg))
+        def show_players(player_count):
+            if player_count is not None:
+                self.show_game_result(game_name, player_count)
+                self.save_settings()
+            else:
+                self.show_result("Player count not available for this game")
+
+        def show_error(e):
+            self.show_result(describe_error(e))
 
-        Clock.schedule_once(get_players_background, 0.1)
+        # a new search makes the previous one irrelevant, even if it is still waiting on steam
+        self.worker.cancel('search')
+        # shared cache, favorites refresh and repeated taps reuse recent counts
+        self.worker.submit('search', get_player_count, appid, 10,
+                           on_done=show_players, on_error=show_error)
 
     def show_result(self, message):
         # show simple text result
-        self.result_layout.clear_widgets()
-        result_label = Label(text=message, size_hint_y=None, height=dp(60),
-                             font_size=dp(14), text_size=(Window.width - dp(40), None),
-                             halign='center', valign='middle')
-        self.result_layout.add_widget(result_label)
+        self.result_list.set_rows([{'viewclass': MessageRow, 'key': None, 'text': message}])
 
     def show_game_result(self, game_name, player_count):
         # show game result with favorite option
-        self.result_layout.clear_widgets()
-
-        card = GameCard(game_name, player_count,
-                        on_favorite=self.toggle_favorite,
-                        is_favorite=game_name in self.favorites)
-
-        # add rounded background to card
-        with card.canvas.before:
-            Color(*self.theme_manager.get_color('card_color'))
-            card.rect = RoundedRectangle(pos=card.pos, size=card.size, radius=[dp(10)])
-        card.bind(pos=self.update_card_bg, size=self.update_card_bg)
-
-        self.result_layout.add_widget(card)
-
-    def update_card_bg(self, instance, *args):
-        # update card background when size changes
-        if hasattr(instance, 'rect'):
-            instance.rect.pos = instance.pos
-            instance.rect.size = instance.size
+        self.result_list.set_rows([{
+            'viewclass': GameCard,
+            'key': game_name,
+            'game_name': game_name,
+            'player_count': player_count,
+            'is_favorite': game_name in self.favorites,
+            'card_color': list(self.theme_manager.get_color('card_color')),
+        }])
 
     def toggle_favorite(self, game_name):
         # add or remove game from favorites
@@ -466,44 +656,41 @@ class SteamApp(FloatLayout):
             self.favorites.add(game_name)
         self.update_favorites_display()
         self.save_settings()
-        # refresh the current result to update star icon
-        if hasattr(self, 'result_layout') and self.result_layout.children:
-            current_result = self.result_layout.children[0]
-            if hasattr(current_result, 'children') and len(current_result.children) > 0:
-                fav_btn = current_result.children[0]  # favorite button is last added
-                if hasattr(fav_btn, 'text'):
-                    fav_btn.text = "★" if game_name in self.favorites else "☆"
+        # the star of the current result follows
+        self.result_list.update_row(game_name, is_favorite=game_name in self.favorites)
+
+    def favorite_text(self, game_name):
+        player_count = self.favorite_counts.get(game_name)
+        if player_count is None:
+            return f"★ {game_name}"
+        return f"★ {game_name} — {player_count:,} players"
 
     def update_favorites_display(self):
-        # refresh favorites list display
-        self.favorites_layout.clear_widgets()
+        # refresh favorites list display, rows are recycled so only the data is rebuilt
         if not self.favorites:
-            label = Label(text="No favorites yet", size_hint_y=None, height=dp(50))
-            self.favorites_layout.add_widget(label)
+            self.favorites_list.set_rows([{'viewclass': MessageRow, 'key': None,
+                                           'text': "No favorites yet"}])
             return
 
-        for game_name in sorted(self.favorites):
-            btn = Button(text=f"★ {game_name}", size_hint_y=None, height=dp(50),
-                         background_color=self.theme_manager.get_color('accent_color'),
-                         halign='left')
-            btn.bind(texture_size=btn.setter('text_size'))
-            btn.bind(on_press=lambda x, name=game_name: self.search_favorite(name))
-            self.favorites_layout.add_widget(btn)
+        accent = list(self.theme_manager.get_color('accent_color'))
+        self.favorites_list.set_rows([
+            {'viewclass': ListRow, 'key': game_name, 'text': self.favorite_text(game_name),
+             'background_color': accent}
+            for game_name in sorted(self.favorites)
+        ])
 
     def update_history_display(self):
         # refresh search history display
-        self.history_layout.clear_widgets()
         if not self.search_history:
-            label = Label(text="No recent searches", size_hint_y=None, height=dp(50))
-            self.history_layout.add_widget(label)
+            self.history_list.set_rows([{'viewclass': MessageRow, 'key': None,
+                                         'text': "No recent searches"}])
             return
 
-        for game_name in reversed(self.search_history[-10:]):  # show last 10 searches
-            btn = Button(text=f"• {game_name}", size_hint_y=None, height=dp(50),
-                         background_color=(0.3, 0.3, 0.3, 1), halign='left')
-            btn.bind(texture_size=btn.setter('text_size'))
-            btn.bind(on_press=lambda x, name=game_name: self.search_from_history(name))
-            self.history_layout.add_widget(btn)
+        self.history_list.set_rows([
+            {'viewclass': ListRow, 'key': game_name, 'text': f"• {game_name}",
+             'background_color': [0.3, 0.3, 0.3, 1]}
+            for game_name in reversed(self.search_history[-10:])  # show last 10 searches
+        ])
 
     def search_favorite(self, game_name):
         # search for favorite game
@@ -516,24 +703,57 @@ class SteamApp(FloatLayout):
         self.get_players(None)
 
     def refresh_favorites(self):
-        # update player counts for all favorite games
-        if not self.apps:
+        # update player counts for all favorite games, all at once and off the ui thread
+        if not self.catalog or self.refreshing_favorites:
             return
+        self.refreshing_favorites = True
+        favorites = list(self.favorites)
+        generation = self.worker.generation('favorites')
+        from steam_core import describe_error, fetch_player_counts
+
+        def refresh_in_background():
+            names_by_appid = {}
+            for game_name in favorites:
+                appid = self.find_appid(game_name)
+                if appid:
+                    names_by_appid.setdefault(appid, []).append(game_name)
+
+            def on_result(appid, player_count, error):
+                if error is not None:
+                    print(f"Error refreshing {names_by_appid[appid]}: {describe_error(error)}")
+                elif player_count is not None:
+                    for game_name in names_by_appid[appid]:
+                        self.worker.post('favorites', generation,
+                                         lambda name=game_name: self.update_favorite_count(name, player_count))
+
+            counts = fetch_player_counts(names_by_appid, on_result=on_result, timeout=5)
+            try:
+                self.history.record(counts)
+                # old samples and rollups are dropped once an hour, like Recorder.run does
+                now = time.monotonic()
+                if now >= self.next_compact:
+                    self.next_compact = now + HISTORY_COMPACT_INTERVAL
+                    self.history.compact()
+            except Exception as e:
+                print(f"Error saving history: {e}")
 
-        for game_name in list(self.favorites):
-            appid = self.find_appid(game_name)
-            if appid:
-                try:
-                    url = f"https://api.steampowered.com/ISteamUserStats/GetNumberOfCurrentPlayers/v1/?appid={appid}"
-                    response = requests.get(url, timeout=5)
-                    if response.status_code == 200:
-                        data = response.json()
-                        player_count = data.get('response', {}).get('player_count')
-                        if player_count is not None:
-                            # update could be implemented here for live refresh
-                            pass
-                except Exception as e:
-                    print(f"Error refreshing {game_name}: {e}")
+        def finished(*args):
+            self.refreshing_favorites = False
+
+        self.worker.submit('favorites', refresh_in_background, on_done=finished, on_error=finished)
+
+    def pause(self):
+        # nothing in flight is worth finishing while the app is in the background
+        self.worker.cancel('search')
+        self.worker.cancel('favorites')
+        self.refreshing_favorites = False
+        # android may kill a paused app without calling on_stop
+        self.settings_store.flush()
+
+    def update_favorite_count(self, game_name, player_count):
+        # called on the ui thread for every count as it arrives
+        self.favorite_counts[game_name] = player_count
+        self.favorites_list.update_row(game_name, text=self.favorite_text(game_name))
 
 
 class SteamPlayerCounterApp(App):
@@ -544,8 +764,15 @@ class SteamPlayerCounterApp(App):
 
     def on_pause(self):
         # handle app pause on mobile
+        self.root.pause()
         return True
 
+    def on_stop(self):
+        self.root.settings_store.flush()
+        self.root.worker.shutdown()
+        if self.root._history is not None:
+            self.root._history.close()
+
     def on_resume(self):
         # handle app resume on mobile
         pass
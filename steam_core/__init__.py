@@ -0,0 +1,37 @@
+# shared code for the desktop, barebones and android front ends.
+# names are imported on first use, so `from steam_core import Catalog` does not pay for
+# requests, sqlite or the http server; every front end wants its first frame up quickly
+import importlib
+
+_EXPORTS = {
+    'appinfo': ['AppTypes', 'enrich', 'guess_type', 'sync_store_types'],
+    'applist': ['AppListCache', 'AppListParser', 'load_app_list'],
+    'catalog': ['Catalog'],
+    'fuzzy': ['SearchEngine'],
+    'history': ['HistoryStore', 'Recorder'],
+    'index': ['IncrementalFilter', 'NameIndex', 'TrigramIndex', 'normalize_name'],
+    'metrics': ['Metrics', 'timed'],
+    'paths': ['api_url', 'atomic_write', 'default_cache_dir'],
+    'players': ['PlayerCountCache', 'SingleFlight', 'fetch_player_count', 'fetch_player_counts',
+                'get_player_count', 'player_count_cache'],
+    'scheduler': ['CircuitOpenError', 'RateLimitedError', 'RequestScheduler', 'SteamAPIError',
+                  'describe_error', 'request_scheduler', 'steam_get'],
+    'startup': ['measure_startup'],
+    'sweep': ['Sweep', 'load_snapshot', 'save_snapshot'],
+}
+_MODULE_OF = {name: module for module, names in _EXPORTS.items() for name in names}
+
+__all__ = sorted(_MODULE_OF)
+
+
+def __getattr__(name):
+    module = _MODULE_OF.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f'.{module}', __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,259 @@
+# command line tools around the shared code: python -m steam_core <command> --help
+import argparse
+import json
+import os
+import sys
+import time
+
+from . import bench
+from .appinfo import AppTypes, enrich, sync_store_types
+from .applist import AppListCache
+from .history import DAY, HistoryStore, Recorder
+from .paths import STEAM_API_URL
+from .scheduler import CircuitOpenError, RequestScheduler
+from .server import DEFAULT_PORT, serve
+from .startup import measure_startup
+from .sweep import DEFAULT_CONNECTIONS, Sweep
+
+
+def resolve_appids(games):
+    # games are appids or names; the catalog is only loaded when there are names
+    appids = []
+    catalog = None
+    for game in games:
+        if game.isdigit():
+            appids.append(int(game))
+            continue
+        if catalog is None:
+            catalog = AppListCache().load(index_substrings=False)
+        appid = catalog.find_appid(game)
+        if appid is None:
+            sys.exit(f"Game not found: {game}")
+        appids.append(appid)
+    return appids
+
+
+def record(args):
+    store = HistoryStore(args.db)
+    recorder = Recorder(store, resolve_appids(args.games), interval=args.interval)
+    print(f"Recording {len(recorder.appids)} games every {args.interval}s into {store.path}",
+          file=sys.stderr)
+    try:
+        recorder.run(on_sample=lambda recorded: print(
+            f"{time.strftime('%H:%M:%S')} recorded {recorded} counts", file=sys.stderr))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        store.close()
+
+
+def history(args):
+    store = HistoryStore(args.db)
+    since = time.time() - args.days * DAY
+    try:
+        for appid in resolve_appids(args.games):
+            peak = store.peak(appid, since)
+            low = store.low(appid, since)
+            average = store.average(appid, since)
+            if peak is None:
+                print(f"{appid}: no data in the last {args.days:g} days")
+            else:
+                print(f"{appid}: peak {peak:,}, low {low:,}, average {average:,.0f} "
+                      f"over the last {args.days:g} days")
+    finally:
+        store.close()
+
+
+def run_server(args):
+    print(f"Serving on http://{args.host}:{args.port}, upstream {args.upstream}", file=sys.stderr)
+    print(f"Point the apps at it with ONLINE_STEAM_API_URL=http://{args.host}:{args.port}", file=sys.stderr)
+    try:
+        serve(args.host, args.port, args.upstream, ttl=args.ttl, cache_dir=args.cache_dir)
+    except KeyboardInterrupt:
+        pass
+
+
+def startup(args):
+    summary = measure_startup(args.imports, runs=args.runs, query=args.query, cache_dir=args.cache_dir)
+    if args.json:
+        print(json.dumps(summary))
+    else:
+        print(f"{summary['games']:,} games from {summary['source']}, median of {summary['runs']} runs")
+        for phase in ('imports', 'catalog', 'first_search', 'in_process', 'total'):
+            print(f"  {phase:<13}{summary[phase] * 1000:8.0f} ms")
+        print(f"  {'worst total':<13}{summary['worst_total'] * 1000:8.0f} ms")
+    if args.budget is not None and summary['total'] > args.budget / 1000:
+        sys.exit(f"startup took {summary['total'] * 1000:.0f} ms, over the {args.budget:g} ms budget")
+
+
+def run_enrich(args):
+    store = AppTypes(args.db)
+    try:
+        api_key = os.environ.get('STEAM_API_KEY')
+        if api_key:
+            stored = sync_store_types(store, api_key)
+            print(f"{stored:,} types from the store listings", file=sys.stderr)
+        if args.games:
+            appids = resolve_appids(args.games)
+        else:
+            # apps still without a type, those with a game-like name first
+            catalog = AppListCache().load(index_substrings=False)
+            mask = store.searchable_mask(catalog)
+            untyped = [position for position in range(len(catalog.appids))
+                       if mask[position] and store.get(catalog.appid(position)) is None]
+            appids = [catalog.appid(position) for position in untyped[:args.limit]]
+        print(f"Looking up {len(appids):,} apps on the store", file=sys.stderr)
+
+        def show(appid, app_type, error):
+            print(f"{appid}: {app_type if error is None else type(error).__name__}")
+
+        enrich(store, appids, max_workers=args.workers, on_result=show)
+        counts = ', '.join(f"{app_type} {count:,}"
+                           for app_type, count in sorted(store.type_counts().items()))
+        print(f"{len(store):,} app types in {store.path}: {counts}", file=sys.stderr)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        store.close()
+
+
+def run_sweep(args):
+    catalog = AppListCache().load(index_substrings=False)
+    # its own rate budget, unless asked to share the default one
+    scheduler = RequestScheduler(rate=args.rate, burst=args.rate) if args.rate else None
+    sweep = Sweep((appid for appid, _ in catalog), cache_dir=args.cache_dir, scheduler=scheduler,
+                  connections=args.connections)
+    started = time.monotonic()
+
+    def show(sweep):
+        rate = sweep.done / max(time.monotonic() - started, 1e-9)
+        print(f"{sweep.done:,}/{sweep.total:,} apps, {sweep.counted:,} with players, "
+              f"{sweep.no_count:,} without, {sweep.failed:,} failed, {rate:.1f}/s", file=sys.stderr)
+
+    try:
+        counts = sweep.run(on_progress=show, restart=args.restart)
+    except KeyboardInterrupt:
+        sys.exit("Stopped, run again to resume")
+    except CircuitOpenError as e:
+        sys.exit(f"{e}. Run again later to resume")
+    if sweep.resumed:
+        print(f"Resumed a sweep that had {sweep.resumed:,} counts already", file=sys.stderr)
+    print(f"Snapshot of {len(counts):,} apps with players, "
+          f"{sum(counts.values()):,} players in total", file=sys.stderr)
+    for appid, player_count in sorted(counts.items(), key=lambda item: -item[1])[:args.top]:
+        position = catalog.position(appid)
+        name = catalog.name(position) if position is not None else appid
+        print(f"{player_count:>12,}  {name}")
+
+
+def run_bench(args):
+    baseline = bench.load_results(args.compare) if args.compare else None
+    if baseline is not None and (baseline['size'], baseline['seed']) != (args.size, args.seed):
+        print(f"Baseline was made with --size {baseline['size']} --seed {baseline['seed']}, "
+              "results will not be comparable", file=sys.stderr)
+    print(f"{'benchmark':<20}{'ops/s':>12}{'p50':>12}{'p95':>12}{'p99':>12}{'peak KiB':>12}")
+
+    def latency(us):
+        # lookups take microseconds and parsing the whole list takes seconds, each value
+        # gets the unit that keeps it short
+        if us >= 1e6:
+            return f"{us / 1e6:,.2f} s"
+        if us >= 1e3:
+            return f"{us / 1e3:,.1f} ms"
+        return f"{us:,.1f} us"
+
+    def show(name, stats):
+        print(f"{name:<20}{stats['ops_per_sec']:>12,.1f}{latency(stats['p50_us']):>12}"
+              f"{latency(stats['p95_us']):>12}{latency(stats['p99_us']):>12}{stats['peak_kb']:>12,.0f}",
+              flush=True)
+
+    results = bench.run_benchmarks(args.size, args.seed, args.seconds, only=args.only, on_result=show)
+    if args.save:
+        bench.save_results(args.save, results, args.size, args.seed)
+    if baseline is None:
+        return
+    print()
+    print(f"{'compared to ' + args.compare:<40}{'p50':>10}{'ops/s':>10}")
+    slower = []
+    for name, latency, throughput, verdict in bench.compare(results, baseline['results'], args.threshold):
+        if verdict == 'new':
+            print(f"{name:<40}{'new':>10}")
+            continue
+        print(f"{name:<40}{latency:>+10.1%}{throughput:>+10.1%}  {verdict}")
+        if verdict == 'slower':
+            slower.append(name)
+    if slower and args.fail_on_regression:
+        sys.exit(f"slower than the baseline: {', '.join(slower)}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m steam_core')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    record_parser = commands.add_parser('record', help="sample player counts of a watchlist on a schedule")
+    record_parser.add_argument('games', nargs='+', help="appids or game names")
+    record_parser.add_argument('--interval', type=int, default=60, help="seconds between samples")
+    record_parser.add_argument('--db', help="history database (default: history.sqlite in the cache folder)")
+    record_parser.set_defaults(run=record)
+
+    history_parser = commands.add_parser('history', help="peak, low and average from recorded history")
+    history_parser.add_argument('games', nargs='+', help="appids or game names")
+    history_parser.add_argument('--days', type=float, default=7, help="how far back to look")
+    history_parser.add_argument('--db', help="history database (default: history.sqlite in the cache folder)")
+    history_parser.set_defaults(run=history)
+
+    serve_parser = commands.add_parser('serve', help="local caching proxy for the steam api")
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    serve_parser.add_argument('--upstream', default=STEAM_API_URL,
+                              help="steam api base url, or a local stub for testing")
+    serve_parser.add_argument('--ttl', type=int, default=30, help="seconds a player count is reused")
+    serve_parser.add_argument('--cache-dir', help="where the server keeps its app list")
+    serve_parser.set_defaults(run=run_server)
+
+    startup_parser = commands.add_parser('startup', help="measure time to a searchable catalog")
+    startup_parser.add_argument('--runs', type=int, default=5, help="fresh processes to measure")
+    startup_parser.add_argument('--import', dest='imports', action='append', default=[],
+                                metavar='MODULE', help="also import this module first, e.g. textual.app")
+    startup_parser.add_argument('--query', default='counter strike', help="the first search to time")
+    startup_parser.add_argument('--cache-dir', help="cache folder to load the catalog from")
+    startup_parser.add_argument('--budget', type=float, metavar='MS',
+                                help="exit with an error when the median total is over this")
+    startup_parser.add_argument('--json', action='store_true', help="print the summary as json")
+    startup_parser.set_defaults(run=startup)
+
+    enrich_parser = commands.add_parser('enrich', help="look up app types so search can skip non-games")
+    enrich_parser.add_argument('games', nargs='*', help="appids or game names (default: apps without a type)")
+    enrich_parser.add_argument('--limit', type=int, default=200, help="apps to look up when no games are given")
+    enrich_parser.add_argument('--workers', type=int, default=4, help="lookups in flight")
+    enrich_parser.add_argument('--db', help="types database (default: appinfo.sqlite in the cache folder)")
+    enrich_parser.set_defaults(run=run_enrich)
+
+    sweep_parser = commands.add_parser('sweep', help="player counts of every app, resumable")
+    sweep_parser.add_argument('--rate', type=float, help="requests per second (default: the shared limit)")
+    sweep_parser.add_argument('--connections', type=int, default=DEFAULT_CONNECTIONS, help="requests in flight")
+    sweep_parser.add_argument('--restart', action='store_true', help="ignore an unfinished sweep")
+    sweep_parser.add_argument('--top', type=int, default=10, help="most played games to print at the end")
+    sweep_parser.add_argument('--cache-dir', help="where the snapshot and checkpoint go")
+    sweep_parser.set_defaults(run=run_sweep)
+
+    bench_parser = commands.add_parser('bench', help="offline microbenchmarks on a synthetic catalog")
+    bench_parser.add_argument('--size', type=int, default=bench.DEFAULT_SIZE, help="apps in the catalog")
+    bench_parser.add_argument('--seed', type=int, default=bench.DEFAULT_SEED)
+    bench_parser.add_argument('--seconds', type=float, default=bench.TARGET_SECONDS,
+                              help="time spent on each benchmark")
+    bench_parser.add_argument('--only', action='append', metavar='NAME', help="run just this benchmark")
+    bench_parser.add_argument('--save', metavar='FILE', help="write the results as json")
+    bench_parser.add_argument('--compare', metavar='FILE', help="results saved earlier to compare against")
+    bench_parser.add_argument('--threshold', type=float, default=bench.DEFAULT_THRESHOLD,
+                              help="p50 change counted as faster / slower (0.1 = 10%%)")
+    bench_parser.add_argument('--fail-on-regression', action='store_true',
+                              help="exit with an error when anything got slower")
+    bench_parser.set_defaults(run=run_bench)
+
+    args = parser.parse_args(argv)
+    args.run(args)
+
+
+if __name__ == '__main__':
+    main()
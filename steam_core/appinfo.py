@@ -0,0 +1,231 @@
+# app types (game, dlc, music, application, demo...) for the catalog. GetAppList only has
+# appids and names, so types come from the store: in bulk from the per kind store listings
+# when there is a web api key, otherwise app by app from appdetails. they are kept in one
+# sqlite file and turned into a per position mask that search uses to skip everything
+# that is not a game or dlc
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .applist import SYNC_OVERLAP, fetch_store_apps
+from .paths import default_cache_dir, store_url
+from .scheduler import RequestScheduler
+
+APP_DETAILS_PATH = "/api/appdetails"
+APPINFO_FILE = 'appinfo.sqlite'
+# the store api allows about 200 appdetails calls per 5 minutes, it has its own bucket so
+# player counts never wait behind it
+STORE_RATE = 0.6
+STORE_BURST = 10
+DEFAULT_CONCURRENCY = 4
+# types hardly ever change, look again after a month
+MAX_AGE = 30 * 24 * 60 * 60
+# how often the apps bring the bulk types up to date
+STORE_SYNC_INTERVAL = 24 * 60 * 60
+SEARCHABLE_TYPES = ('game', 'dlc')
+# the store listing flag for each type it can tell apart
+STORE_LISTINGS = {
+    'include_games': 'game',
+    'include_dlc': 'dlc',
+    'include_software': 'application',
+    'include_videos': 'video',
+    'include_hardware': 'hardware',
+}
+# what names of apps the store knows nothing about give away; checked in order
+_GUESSES = (
+    ('music', re.compile(r'\b(soundtrack|ost|original score)\b', re.I)),
+    ('tool', re.compile(r'\b(dedicated server|server|sdk|editor|mod tools|benchmark)$|'
+                        r'\b(dedicated server|sdk|mod tools)\b', re.I)),
+    ('beta', re.compile(r'\b(playtest|public test|test server|beta)\b', re.I)),
+    ('demo', re.compile(r'\bdemo\b', re.I)),
+    ('video', re.compile(r'\b(trailer|teaser)\b', re.I)),
+    ('extra', re.compile(r'\b(wallpapers?|artbook|art book|digital art)\b', re.I)),
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS app_types (
+    appid INTEGER PRIMARY KEY,
+    type TEXT NOT NULL,
+    fetched_at INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+store_scheduler = RequestScheduler(rate=STORE_RATE, burst=STORE_BURST)
+
+
+def fetch_app_type(appid, timeout=10):
+    # the store's type for appid, 'unknown' when the store has no page for it
+    response = store_scheduler.get(store_url(APP_DETAILS_PATH),
+                                   params={'appids': appid, 'filters': 'basic'}, timeout=timeout)
+    response.raise_for_status()
+    entry = (response.json() or {}).get(str(appid)) or {}
+    if not entry.get('success'):
+        return 'unknown'
+    return (entry.get('data') or {}).get('type') or 'unknown'
+
+
+def guess_type(name):
+    # type suggested by the name alone, None when it looks like an ordinary game
+    for app_type, pattern in _GUESSES:
+        if pattern.search(name):
+            return app_type
+    return None
+
+
+class AppTypes:
+    # {appid: type} backed by sqlite; everything is read into memory once, writes go
+    # through to the file in batches
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(default_cache_dir(), APPINFO_FILE)
+        folder = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(folder, exist_ok=True)
+        # written from enrichment workers, read on the ui thread
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.executescript(_SCHEMA)
+        self.lock = threading.Lock()
+        self.types = {}
+        self.fetched_at = {}
+        for appid, app_type, fetched_at in self.db.execute('SELECT * FROM app_types'):
+            self.types[appid] = app_type
+            self.fetched_at[appid] = fetched_at
+        # bumped on every update, masks built before it are out of date
+        self.version = 0
+        self._mask = None
+        self._mask_key = None
+        self._guesses = None
+        self._guesses_key = None
+
+    def __len__(self):
+        return len(self.types)
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+    def get(self, appid):
+        return self.types.get(appid)
+
+    def get_meta(self, key):
+        row = self.db.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        with self.lock, self.db:
+            self.db.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)', (key, int(value)))
+
+    def update(self, pairs, now=None):
+        # store (appid, type) pairs, returns how many were written
+        now = int(now if now is not None else time.time())
+        rows = [(appid, app_type, now) for appid, app_type in pairs]
+        if not rows:
+            return 0
+        with self.lock:
+            with self.db:
+                self.db.executemany('INSERT OR REPLACE INTO app_types VALUES (?, ?, ?)', rows)
+            for appid, app_type, fetched_at in rows:
+                self.types[appid] = app_type
+                self.fetched_at[appid] = fetched_at
+            self.version += 1
+        return len(rows)
+
+    def stale(self, appids, max_age=MAX_AGE, now=None):
+        # the appids whose type is unknown or older than max_age, in the given order
+        cutoff = (now if now is not None else time.time()) - max_age
+        return [appid for appid in appids if self.fetched_at.get(appid, 0) < cutoff]
+
+    def type_counts(self):
+        counts = {}
+        for app_type in self.types.values():
+            counts[app_type] = counts.get(app_type, 0) + 1
+        return counts
+
+    def searchable_mask(self, catalog, types=SEARCHABLE_TYPES):
+        # bytearray with a 1 for every catalog position whose app is one of `types`, for
+        # search's only= argument. apps the store has not told us about are kept unless
+        # their name gives them away. the mask is rebuilt only when the catalog or the
+        # types changed, and then as a new object so filters notice
+        shape = (id(catalog), len(catalog.appids), len(catalog.removed))
+        key = (shape, self.version, tuple(types))
+        if self._mask_key == key:
+            return self._mask
+        if self._guesses_key != shape:
+            # the names never change under a position, so the regexes run once per catalog
+            self._guesses = bytearray(guess_type(catalog.name(position)) is None
+                                      and position not in catalog.removed
+                                      for position in range(len(catalog.appids)))
+            self._guesses_key = shape
+        known = self.types
+        mask = bytearray(self._guesses)
+        for position, appid in enumerate(catalog.appids):
+            app_type = known.get(appid)
+            if app_type is not None and app_type != 'unknown':
+                mask[position] = app_type in types and position not in catalog.removed
+        self._mask = mask
+        self._mask_key = key
+        return mask
+
+
+def enrich(store, appids, max_workers=DEFAULT_CONCURRENCY, timeout=10, max_age=MAX_AGE,
+           on_result=None, should_stop=None, batch_size=50):
+    # look up the type of every stale appid on the store, max_workers at a time (the store
+    # scheduler keeps the overall rate). on_result(appid, type, error) is called on the
+    # calling thread as each finishes; returns {appid: type} of what was stored.
+    # once should_stop() is true the lookups not started yet are skipped
+    appids = store.stale(dict.fromkeys(appids), max_age)
+    results = {}
+    if not appids:
+        return results
+
+    def look_up(appid):
+        if should_stop is not None and should_stop():
+            return None
+        return fetch_app_type(appid, timeout)
+
+    pending = []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(appids))) as pool:
+        futures = {pool.submit(look_up, appid): appid for appid in appids}
+        for future in as_completed(futures):
+            appid = futures[future]
+            try:
+                app_type = future.result()
+                error = None
+            except Exception as e:
+                app_type = None
+                error = e
+            if app_type is not None:
+                results[appid] = app_type
+                pending.append((appid, app_type))
+                if len(pending) >= batch_size:
+                    store.update(pending)
+                    pending = []
+            if on_result is not None:
+                on_result(appid, app_type, error)
+    store.update(pending)
+    return results
+
+
+def sync_store_types(store, api_key, timeout=15, url=None, min_interval=0):
+    # bulk types from the store listings, one listing per kind. after the first run only
+    # apps changed since the last one are asked for. returns how many types were stored,
+    # None when the last sync is less than min_interval seconds old
+    started = time.time()
+    since = store.get_meta('store_synced_at')
+    if since is not None and started - since < min_interval:
+        return None
+    if since is not None:
+        since -= SYNC_OVERLAP
+    stored = 0
+    for flag, app_type in STORE_LISTINGS.items():
+        listed = fetch_store_apps(api_key, since, include=(flag,), url=url, timeout=timeout)
+        stored += store.update((appid, app_type) for appid, _ in listed)
+    store.set_meta('store_synced_at', started)
+    return stored
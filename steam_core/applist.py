@@ -0,0 +1,351 @@
+import codecs
+import json
+import os
+import sys
+import tempfile
+import time
+
+import requests
+
+from .catalog import Catalog
+from .metrics import metrics, timed
+from .paths import api_url, atomic_write, default_cache_dir
+from .scheduler import steam_get
+
+APP_LIST_PATH = "/ISteamApps/GetAppList/v2/"
+# lists apps changed since a time, a page at a time; needs a web api key
+STORE_APP_LIST_PATH = "/IStoreService/GetAppList/v1/"
+STORE_PAGE_SIZE = 50000
+# the listing's include_* flags, all on unless asked for just some kinds
+STORE_INCLUDE = ('include_games', 'include_dlc', 'include_software', 'include_videos',
+                 'include_hardware')
+CACHE_FILE = 'applist.json'
+META_FILE = 'applist.meta.json'
+# compact binary copy of the parsed list, read back on the next start instead of the json
+CATALOG_FILE = 'catalog.bin'
+# the list changes a few times a day, no need to ask steam more often than that
+DEFAULT_MAX_AGE = 6 * 60 * 60
+# bytes read from the network or the cache file at a time
+CHUNK_SIZE = 64 * 1024
+# rough catalog size shown in progress before the first download told us the real one
+EXPECTED_APPS = 200000
+PROGRESS_EVERY = 10000
+# the change listing never reports removed apps, a full download every week catches those
+FULL_SYNC_AGE = 7 * 24 * 60 * 60
+# asking for a little more than needed covers clock differences with steam, merging is idempotent
+SYNC_OVERLAP = 5 * 60
+
+
+class AppListParser:
+    # incremental parser for {"applist": {"apps": [{"appid": 1, "name": "..."}, ...]}}.
+    # feed() takes raw bytes as they arrive and returns the apps completed by them,
+    # so neither the whole text nor the whole json tree is ever held in memory
+
+    def __init__(self):
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.json = json.JSONDecoder()
+        self.buffer = ''
+        self.in_list = False
+        self.done = False
+
+    def feed(self, chunk, final=False):
+        self.buffer += self.decoder.decode(chunk, final)
+        apps = []
+        if not self.in_list and not self.done:
+            key_at = self.buffer.find('"apps"')
+            bracket_at = self.buffer.find('[', key_at) if key_at >= 0 else -1
+            if bracket_at < 0:
+                # keep a tail in case the key is split between two chunks
+                self.buffer = self.buffer[key_at:] if key_at >= 0 else self.buffer[-8:]
+                if final:
+                    raise ValueError("app list has no apps array")
+                return apps
+            self.buffer = self.buffer[bracket_at + 1:]
+            self.in_list = True
+
+        buffer = self.buffer
+        position = 0
+        while self.in_list:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position >= len(buffer):
+                break
+            if buffer[position] == ']':
+                self.in_list = False
+                self.done = True
+                break
+            try:
+                app, position_after = self.json.raw_decode(buffer, position)
+            except ValueError:
+                if final:
+                    raise
+                # the object continues in the next chunk
+                break
+            position = position_after
+            appid = app.get('appid')
+            if appid is not None:
+                apps.append((appid, app.get('name', '')))
+        self.buffer = buffer[position:]
+        if final and not self.done:
+            raise ValueError("app list ended early")
+        return apps
+
+
+class AppListCache:
+    # keeps the last good GetAppList payload on disk and revalidates it
+    # with ETag / Last-Modified once it gets older than max_age.
+    # with a web api key (api_key or STEAM_API_KEY) an old cache is brought up to date
+    # from the list of apps changed since the last sync instead of downloading everything,
+    # unless delta=False (a synced catalog no longer matches the cached json payload)
+
+    def __init__(self, cache_dir=None, max_age=DEFAULT_MAX_AGE, url=None, timeout=15,
+                 api_key=None, store_url=None, delta=True):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_age = max_age
+        self.url = url or api_url(APP_LIST_PATH)
+        self.store_url = store_url or api_url(STORE_APP_LIST_PATH)
+        self.api_key = api_key or os.environ.get('STEAM_API_KEY')
+        self.delta = delta
+        self.timeout = timeout
+        # where the last load() got its data from: 'cache', 'revalidated', 'delta', 'network' or 'stale'
+        self.source = None
+
+    @property
+    def data_path(self):
+        return os.path.join(self.cache_dir, CACHE_FILE)
+
+    @property
+    def meta_path(self):
+        return os.path.join(self.cache_dir, META_FILE)
+
+    @property
+    def catalog_path(self):
+        return os.path.join(self.cache_dir, CATALOG_FILE)
+
+    def read_meta(self):
+        try:
+            with open(self.meta_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def write_meta(self, meta):
+        atomic_write(self.meta_path, json.dumps(meta))
+
+    def read_cached(self, index_substrings, on_progress=None, expected=None):
+        catalog = self.read_catalog_file(index_substrings)
+        if catalog is not None:
+            return catalog
+        try:
+            with open(self.data_path, 'rb') as f:
+                chunks = iter(lambda: f.read(CHUNK_SIZE), b'')
+                catalog = build_catalog(chunks, index_substrings, on_progress, expected)
+        except (OSError, ValueError):
+            return None
+        self.write_catalog_file(catalog)
+        # changes synced on top of the json are gone with the old catalog file,
+        # the next sync starts again from the full download
+        meta = self.read_meta()
+        if meta.pop('synced_at', None) is not None:
+            self.write_meta(meta)
+        return catalog
+
+    def read_catalog_file(self, index_substrings):
+        # only trusted when written after the json it was made from
+        try:
+            if os.path.getmtime(self.catalog_path) < os.path.getmtime(self.data_path):
+                return None
+            return Catalog.open(self.catalog_path, index_substrings)
+        except (OSError, ValueError):
+            return None
+
+    def write_catalog_file(self, catalog):
+        try:
+            catalog.save(self.catalog_path)
+        except OSError as e:
+            print(f"Could not write catalog cache: {e}", file=sys.stderr)
+
+    def is_fresh(self, meta):
+        fetched_at = meta.get('fetched_at', 0)
+        return time.time() - fetched_at < self.max_age
+
+    def can_sync(self, meta):
+        full_at = meta.get('full_at') or meta.get('fetched_at', 0)
+        return self.delta and bool(self.api_key) and time.time() - full_at < FULL_SYNC_AGE
+
+    def load(self, force_refresh=False, on_progress=None, index_substrings=True):
+        # returns a Catalog filled while the list streams in from the cache file or steam.
+        # on_progress(loaded, expected) is called every few thousand apps,
+        # index_substrings=False leaves the trigram index to be built on first search
+        with metrics.timer('app_list_load_seconds'):
+            catalog = self._load(force_refresh, on_progress, index_substrings)
+        metrics.increment('app_list_loads_total', source=self.source)
+        return catalog
+
+    def _load(self, force_refresh, on_progress, index_substrings):
+        meta = self.read_meta()
+        expected = meta.get('count') or EXPECTED_APPS
+        has_data = os.path.exists(self.data_path)
+        if not has_data:
+            # no data file, the validators are useless
+            meta = {}
+        elif not force_refresh and self.is_fresh(meta):
+            catalog = self.read_cached(index_substrings, on_progress, expected)
+            if catalog is not None:
+                self.source = 'cache'
+                return catalog
+
+        if has_data and not force_refresh and self.can_sync(meta):
+            catalog = self.sync_changes(index_substrings, on_progress, expected)
+            if catalog is not None:
+                self.source = 'delta'
+                return catalog
+
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+
+        try:
+            response = steam_get(self.url, headers=headers, timeout=self.timeout, stream=True)
+            if response.status_code == 304:
+                response.close()
+                catalog = self.read_cached(index_substrings, on_progress, expected)
+                if catalog is not None:
+                    meta['fetched_at'] = meta['full_at'] = time.time()
+                    self.write_meta(meta)
+                    self.source = 'revalidated'
+                    return catalog
+                # cache file went missing or broken, ask again without validators
+                response = steam_get(self.url, timeout=self.timeout, stream=True)
+            response.raise_for_status()
+            catalog = self.download(response, index_substrings, on_progress, expected)
+        except (requests.exceptions.RequestException, ValueError):
+            # network is down or steam sent garbage, fall back to the last good copy
+            catalog = self.read_cached(index_substrings, on_progress, expected) if has_data else None
+            if catalog is None:
+                raise
+            self.source = 'stale'
+            return catalog
+
+        self.source = 'network'
+        return catalog
+
+    def sync_changes(self, index_substrings, on_progress, expected):
+        # merge the apps changed since the last sync into the cached catalog and save it;
+        # None when that is not possible, the caller falls back to a full download
+        catalog = self.read_cached(index_substrings, on_progress, expected)
+        if catalog is None:
+            return None
+        meta = self.read_meta()
+        since = meta.get('synced_at') or meta.get('full_at') or meta.get('fetched_at')
+        if not since:
+            return None
+        started = time.time()
+        try:
+            with metrics.timer('app_list_sync_seconds'):
+                changes = list(fetch_store_apps(self.api_key, since - SYNC_OVERLAP,
+                                                url=self.store_url, timeout=self.timeout))
+        except (requests.exceptions.RequestException, ValueError) as e:
+            # not the message itself, request errors can carry the url and with it the key
+            print(f"Could not sync app list changes ({type(e).__name__}), downloading the full list",
+                  file=sys.stderr)
+            return None
+        added, renamed = catalog.merge(changes)
+        metrics.increment('app_list_sync_changes_total', added, change='added')
+        metrics.increment('app_list_sync_changes_total', renamed, change='renamed')
+        if added or renamed:
+            self.write_catalog_file(catalog)
+        meta.update(synced_at=started, fetched_at=time.time(), count=len(catalog))
+        self.write_meta(meta)
+        return catalog
+
+    def download(self, response, index_substrings, on_progress, expected):
+        # parse the body while copying it to a temp file, the temp file only
+        # replaces the cache once the whole list parsed fine
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix='.tmp-', suffix=CACHE_FILE)
+            tmp_file = os.fdopen(fd, 'wb')
+        except OSError as e:
+            # a read-only cache folder should not break the app
+            print(f"Could not write app list cache: {e}", file=sys.stderr)
+            tmp_path = tmp_file = None
+
+        def chunks():
+            for chunk in response.iter_content(CHUNK_SIZE):
+                if tmp_file is not None:
+                    tmp_file.write(chunk)
+                yield chunk
+
+        try:
+            with response:
+                catalog = build_catalog(chunks(), index_substrings, on_progress, expected)
+        except BaseException:
+            if tmp_file is not None:
+                tmp_file.close()
+                os.remove(tmp_path)
+            raise
+
+        if tmp_file is not None:
+            try:
+                tmp_file.close()
+                os.replace(tmp_path, self.data_path)
+                now = time.time()
+                self.write_meta({
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified'),
+                    'fetched_at': now,
+                    'full_at': now,
+                    'count': len(catalog),
+                })
+            except OSError as e:
+                print(f"Could not write app list cache: {e}", file=sys.stderr)
+            else:
+                self.write_catalog_file(catalog)
+        return catalog
+
+
+def fetch_store_apps(api_key, since=None, include=STORE_INCLUDE, url=None, timeout=15):
+    # (appid, name) of every store app of the included kinds, only those changed after
+    # the unix time `since` when given, page by page
+    url = url or api_url(STORE_APP_LIST_PATH)
+    params = {'key': api_key, 'max_results': STORE_PAGE_SIZE}
+    if since is not None:
+        params['if_modified_since'] = int(since)
+    for flag in STORE_INCLUDE:
+        params[flag] = 'true' if flag in include else 'false'
+    while True:
+        response = steam_get(url, params=params, timeout=timeout)
+        response.raise_for_status()
+        page = response.json().get('response', {})
+        for app in page.get('apps', ()):
+            if app.get('appid') is not None:
+                yield app['appid'], app.get('name', '')
+        if not page.get('have_more_results') or not page.get('last_appid'):
+            return
+        params['last_appid'] = page['last_appid']
+
+
+# while downloading this includes waiting on the network, the stream is parsed as it arrives
+@timed('app_list_parse_seconds')
+def build_catalog(chunks, index_substrings=True, on_progress=None, expected=None):
+    parser = AppListParser()
+    catalog = Catalog(index_substrings)
+    next_report = PROGRESS_EVERY
+    for chunk in chunks:
+        for appid, name in parser.feed(chunk):
+            catalog.add(appid, name)
+        if on_progress is not None and len(catalog) >= next_report:
+            on_progress(len(catalog), expected)
+            next_report = len(catalog) + PROGRESS_EVERY
+    for appid, name in parser.feed(b'', final=True):
+        catalog.add(appid, name)
+    if on_progress is not None:
+        on_progress(len(catalog), len(catalog))
+    return catalog
+
+
+def load_app_list(cache_dir=None, max_age=DEFAULT_MAX_AGE, timeout=15, on_progress=None):
+    return AppListCache(cache_dir, max_age=max_age, timeout=timeout).load(on_progress=on_progress)
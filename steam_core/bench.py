@@ -0,0 +1,207 @@
+# offline microbenchmarks for the hot paths: parsing GetAppList, exact / partial / fuzzy
+# name lookups, the suggestion filter and paging through results. everything runs on a
+# synthetic catalog generated from a seed, so numbers are comparable between runs and machines
+import gc
+import json
+import random
+import statistics
+import time
+import tracemalloc
+
+from .appinfo import guess_type
+from .applist import CHUNK_SIZE, build_catalog
+
+DEFAULT_SIZE = 200000
+DEFAULT_SEED = 1
+# each benchmark runs for about this long, or at least MIN_SAMPLES times
+TARGET_SECONDS = 1.0
+MIN_SAMPLES = 3
+# changes smaller than this are noise
+DEFAULT_THRESHOLD = 0.10
+
+_WORDS = (
+    'Dark Souls Knight Hollow Legend Empire War Space Station Galaxy Dragon Quest Kingdom Farm '
+    'Simulator Racing Zombie Survival City Builder Tactics Heroes Shadow Blade Fantasy Chronicles '
+    'Dungeon Hunter Pirate Ocean Star Wars Ghost Tower Defense Puzzle Adventure Island Mystery '
+    'Horror Night Rogue Arena Battle Royale Legends Counter Strike Global Offensive Cyber Punk '
+    'Neon Drift Sky Forge Iron Steel Storm Frontier Colony Planet Craft Mine Block Party Tale '
+    'Saga Odyssey Origins Rebirth Tycoon Manager Football Soccer Truck Train Flight Pixel Retro '
+    'Arcade Hero Witch Magic Academy Castle Crusader Viking Samurai Ninja Robot Mech Alien'
+).split()
+_SUFFIXES = ('', '', '', '', ' 2', ' 3', ' II', ' III', ' Remastered', ' Soundtrack', ' Demo',
+             ' - Season Pass', ' - Deluxe Edition', ' DLC', ' Playtest', ' (2019)', '™', ' VR')
+_ACCENTED = ('Café', 'Über', 'Niño', 'Señor', 'Ærø', 'Ōkami', 'Mädchen', 'Öl')
+
+
+def synthetic_apps(size=DEFAULT_SIZE, seed=DEFAULT_SEED):
+    # (appid, name) pairs that look like steam's list: short multi word titles, sequels,
+    # soundtracks and dlc of the same title, a few duplicates, accents and empty names
+    rng = random.Random(seed)
+    apps = []
+    appid = 10
+    titles = []
+    while len(apps) < size:
+        appid += rng.choice((10, 10, 20, 30, 70, 110, 1000))
+        roll = rng.random()
+        if roll < 0.01:
+            name = ''
+        elif roll < 0.35 and titles:
+            # dlc, soundtrack or sequel of an earlier title
+            name = rng.choice(titles) + rng.choice(_SUFFIXES[4:])
+        else:
+            words = rng.sample(_WORDS, rng.choice((1, 2, 2, 3, 3, 4)))
+            if rng.random() < 0.03:
+                words.append(rng.choice(_ACCENTED))
+            name = ' '.join(words) + rng.choice(_SUFFIXES[:6])
+            titles.append(name)
+        apps.append((appid, name))
+    return apps
+
+
+def app_list_payload(apps):
+    return json.dumps({'applist': {'apps': [{'appid': appid, 'name': name}
+                                            for appid, name in apps]}}).encode('utf-8')
+
+
+def chunked(data, size=CHUNK_SIZE):
+    return (data[i:i + size] for i in range(0, len(data), size))
+
+
+def typo(rng, text):
+    # swap two neighbouring letters, the most common typing mistake
+    if len(text) < 4:
+        return text
+    i = rng.randrange(1, len(text) - 2)
+    return text[:i] + text[i + 1] + text[i] + text[i + 2:]
+
+
+def measure(operation, inputs, target_seconds=TARGET_SECONDS, min_samples=MIN_SAMPLES):
+    # latency of every call plus peak memory of one traced call.
+    # inputs are cycled through so caches see a realistic mix
+    timings = []
+    deadline = time.perf_counter() + target_seconds
+    i = 0
+    gc.collect()
+    while len(timings) < min_samples or time.perf_counter() < deadline:
+        value = inputs[i % len(inputs)]
+        started = time.perf_counter_ns()
+        operation(value)
+        timings.append(time.perf_counter_ns() - started)
+        i += 1
+
+    tracemalloc.start()
+    try:
+        operation(inputs[0])
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    timings.sort()
+    total = sum(timings)
+
+    def percentile(fraction):
+        return timings[min(len(timings) - 1, int(fraction * len(timings)))] / 1000
+
+    return {
+        'samples': len(timings),
+        'ops_per_sec': len(timings) / (total / 1e9),
+        'mean_us': statistics.fmean(timings) / 1000,
+        'p50_us': percentile(0.50),
+        'p95_us': percentile(0.95),
+        'p99_us': percentile(0.99),
+        'max_us': timings[-1] / 1000,
+        'peak_kb': peak / 1024,
+    }
+
+
+def run_benchmarks(size=DEFAULT_SIZE, seed=DEFAULT_SEED, target_seconds=TARGET_SECONDS,
+                   only=None, on_result=None):
+    # {benchmark name: stats}; on_result(name, stats) is called as each one finishes
+    rng = random.Random(seed)
+    apps = synthetic_apps(size, seed)
+    payload = app_list_payload(apps)
+    catalog = build_catalog(chunked(payload))
+    engine = catalog.search_engine
+    named = [name for _, name in apps if name]
+
+    exact = [rng.choice(named) for _ in range(1000)]
+    partial = []
+    for name in rng.sample(named, 1000):
+        start = rng.randrange(max(1, len(name) - 5))
+        partial.append(name[start:start + rng.choice((4, 5, 6, 8))])
+    typos = [typo(rng, name) for name in rng.sample(named, 200)]
+    filters = [name[:rng.choice((3, 4, 5, 7, 10))] for name in rng.sample(named, 200)]
+    # what typing "dragon quest" letter by letter asks the filter for
+    typing = ['dragon quest'[:length] for length in range(3, 13)]
+    # what games only search gets before any types are known: the names are all there is
+    games_only = bytearray(guess_type(name) is None for _, name in apps)
+    results = engine.search('dragon', limit=None)
+    pages = list(range(0, max(1, len(results) - 10), 10)) or [0]
+
+    def fresh_filter(query):
+        engine.filter.reset()
+        engine.search(query, limit=None)
+
+    def typed_filter(_):
+        engine.filter.reset()
+        for query in typing:
+            engine.search(query, limit=None)
+
+    def games_only_filter(query):
+        engine.filter.reset()
+        engine.search(query, limit=None, only=games_only)
+
+    def page(offset):
+        # what the result list does when it moves its window
+        return [catalog.name(position) for position in results[offset:offset + 10]]
+
+    benchmarks = [
+        ('parse', lambda _: build_catalog(chunked(payload), index_substrings=False), [None]),
+        ('parse_and_index', lambda _: build_catalog(chunked(payload)), [None]),
+        ('find_appid_exact', catalog.find_appid, exact),
+        ('find_appid_partial', lambda query: catalog.trigram_index.search(query, limit=1), partial),
+        ('find_appid_fuzzy', lambda query: engine.fuzzy(query, 1), typos),
+        ('filter', fresh_filter, filters),
+        ('filter_typing', typed_filter, [None]),
+        ('filter_games_only', games_only_filter, filters),
+        ('show_page', page, pages),
+    ]
+    results_by_name = {}
+    for name, operation, inputs in benchmarks:
+        if only and name not in only:
+            continue
+        stats = measure(operation, inputs, target_seconds)
+        results_by_name[name] = stats
+        if on_result is not None:
+            on_result(name, stats)
+    return results_by_name
+
+
+def compare(current, baseline, threshold=DEFAULT_THRESHOLD):
+    # [(name, p50 change, throughput change, verdict)], changes as fractions of the baseline
+    rows = []
+    for name, stats in current.items():
+        before = baseline.get(name)
+        if before is None:
+            rows.append((name, None, None, 'new'))
+            continue
+        latency = stats['p50_us'] / before['p50_us'] - 1
+        throughput = stats['ops_per_sec'] / before['ops_per_sec'] - 1
+        if latency > threshold:
+            verdict = 'slower'
+        elif latency < -threshold:
+            verdict = 'faster'
+        else:
+            verdict = 'same'
+        rows.append((name, latency, throughput, verdict))
+    return rows
+
+
+def save_results(path, results, size, seed):
+    with open(path, 'w') as f:
+        json.dump({'size': size, 'seed': seed, 'results': results}, f, indent=2)
+
+
+def load_results(path):
+    with open(path, 'r') as f:
+        return json.load(f)
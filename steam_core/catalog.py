@@ -0,0 +1,186 @@
+# the loaded app list together with the lookup structures built from it
+import struct
+import sys
+from array import array
+
+from .fuzzy import SearchEngine
+from .index import NameIndex, TrigramIndex
+from .metrics import timed
+from .paths import atomic_write
+
+# file layout: header, appids (uint32 each), name offsets (count + 1 uint32), utf-8 names.
+# everything is in the writer's byte order, which the header records
+CATALOG_MAGIC = b'OSCATLG1'
+_HEADER = struct.Struct('<8s2sxxII')
+
+
+class Catalog:
+    # apps are addressed by position (the order steam listed them in), which is
+    # also what the trigram index and the search engine hand back.
+    # appids live in a typed array and all names in one utf-8 buffer with an offsets
+    # array next to it, a few bytes of overhead per app instead of a dict per app
+
+    def __init__(self, index_substrings=True):
+        self.appids = array('I')
+        self.name_data = bytearray()
+        self.name_offsets = array('I', (0,))
+        self.name_index = NameIndex()
+        # the trigram index is the expensive part, the barebones script only builds it when needed
+        self.trigram_index = TrigramIndex() if index_substrings else None
+        self._search_engine = None
+        self._positions = None
+        # positions of removed or renamed apps; their slots stay so positions never move
+        self.removed = set()
+
+    def __len__(self):
+        # apps in the catalog, positions run up to len(self.appids)
+        return len(self.appids) - len(self.removed)
+
+    def __iter__(self):
+        # (appid, name) pairs in catalog order
+        for position in range(len(self.appids)):
+            if position not in self.removed:
+                yield self.appids[position], self.name(position)
+
+    def add(self, appid, name):
+        if self._positions is not None:
+            self._positions.setdefault(appid, len(self.appids))
+        self.appids.append(appid)
+        self.name_data += name.encode('utf-8')
+        self.name_offsets.append(len(self.name_data))
+        self.name_index.add(appid, name)
+        if self.trigram_index is not None:
+            self.trigram_index.add(name)
+
+    def appid(self, position):
+        return self.appids[position]
+
+    def name(self, position):
+        offsets = self.name_offsets
+        return bytes(self.name_data[offsets[position]:offsets[position + 1]]).decode('utf-8')
+
+    @timed('find_appid_seconds')
+    def find_appid(self, name):
+        return self.name_index.find_appid(name)
+
+    def position(self, appid):
+        # position of an appid, or None
+        return self._position_map().get(appid)
+
+    def _position_map(self):
+        # the reverse map is built on first use
+        if self._positions is None:
+            self._positions = {}
+            for position, known in enumerate(self.appids):
+                if position not in self.removed:
+                    self._positions.setdefault(known, position)
+        return self._positions
+
+    def remove(self, appid):
+        # drops the app from lookups and searches, True when it was there
+        position = self.position(appid)
+        if position is None:
+            return False
+        self.removed.add(position)
+        del self._positions[appid]
+        self.name_index.remove(appid, self.name(position))
+        if self.trigram_index is not None:
+            self.trigram_index.remove(position)
+        return True
+
+    def merge(self, apps):
+        # apply (appid, name) changes in place: unknown appids are added, known ones with a
+        # different name are renamed (the old slot is removed, the new name appended), so the
+        # indexes are updated instead of rebuilt. returns (added, renamed)
+        positions = self._position_map()
+        added = renamed = 0
+        for appid, name in apps:
+            position = positions.get(appid)
+            if position is None:
+                added += 1
+            elif self.name(position) != name:
+                self.remove(appid)
+                renamed += 1
+            else:
+                continue
+            self.add(appid, name)
+        if (added or renamed) and self._search_engine is not None:
+            # its last result may miss the new names
+            self._search_engine.filter.reset()
+        return added, renamed
+
+    @property
+    def search_engine(self):
+        if self._search_engine is None:
+            if self.trigram_index is None:
+                self.trigram_index = TrigramIndex(self.name(position) for position in range(len(self.appids)))
+                for position in self.removed:
+                    self.trigram_index.remove(position)
+            self._search_engine = SearchEngine(self.trigram_index)
+        return self._search_engine
+
+    def set_popularity(self, counts):
+        # rank search results by {appid: current players}, e.g. from a sweep snapshot
+        popularity = array('I', bytes(4 * len(self.appids)))
+        for appid, player_count in counts.items():
+            position = self.position(appid)
+            if position is not None:
+                popularity[position] = min(player_count, 0xFFFFFFFF)
+        self.search_engine.popularity = popularity
+
+    def nbytes(self):
+        # memory held by the catalog data itself, indexes not included
+        return (self.appids.itemsize * len(self.appids) + len(self.name_data)
+                + self.name_offsets.itemsize * len(self.name_offsets))
+
+    def save(self, path):
+        if self.removed:
+            # removed slots are not written, the file always holds a compact catalog
+            compact = Catalog(index_substrings=False)
+            for appid, name in self:
+                compact.appids.append(appid)
+                compact.name_data += name.encode('utf-8')
+                compact.name_offsets.append(len(compact.name_data))
+            compact.save(path)
+            return
+        byteorder = b'le' if sys.byteorder == 'little' else b'be'
+        header = _HEADER.pack(CATALOG_MAGIC, byteorder, len(self.appids), len(self.name_data))
+        atomic_write(path, b''.join((header, self.appids.tobytes(), self.name_offsets.tobytes(),
+                                     bytes(self.name_data))))
+
+    @classmethod
+    @timed('catalog_open_seconds')
+    def open(cls, path, index_substrings=True):
+        # read a file written by save(). this skips parsing the json, but the name and
+        # trigram indexes are not in the file: they are built again from every name here,
+        # which is most of the time it takes
+        with open(path, 'rb') as f:
+            data = f.read()
+        try:
+            magic, byteorder, count, names_size = _HEADER.unpack_from(data, 0)
+        except struct.error:
+            raise ValueError(f"{path} is not a valid catalog file")
+        native = b'le' if sys.byteorder == 'little' else b'be'
+        if magic != CATALOG_MAGIC or byteorder != native:
+            raise ValueError(f"{path} is not a catalog file for this machine")
+        if len(data) != _HEADER.size + 4 * (2 * count + 1) + names_size:
+            raise ValueError(f"{path} is truncated")
+        view = memoryview(data)
+        start = _HEADER.size
+        appids = array('I')
+        appids.frombytes(view[start:start + 4 * count])
+        start += 4 * count
+        offsets = array('I')
+        offsets.frombytes(view[start:start + 4 * (count + 1)])
+        start += 4 * (count + 1)
+
+        catalog = cls(index_substrings=index_substrings)
+        catalog.appids = appids
+        catalog.name_offsets = offsets
+        catalog.name_data = bytearray(view[start:start + names_size])
+        for position in range(count):
+            name = catalog.name(position)
+            catalog.name_index.add(appids[position], name)
+            if catalog.trigram_index is not None:
+                catalog.trigram_index.add(name)
+        return catalog
@@ -0,0 +1,244 @@
+# ranked search: substring hits first, typo tolerant matches after them
+import heapq
+import re
+from collections import Counter
+from operator import itemgetter
+
+from .index import IncrementalFilter, normalize_name, trigrams
+from .metrics import timed
+
+# how many names with the best trigram overlap get a full fuzzy score
+FUZZY_CANDIDATES = 2000
+# names scoring below this are not shown at all
+MIN_FUZZY_SCORE = 0.7
+# unlimited searches stop looking for typo matches once this many names contain the query
+FUZZY_FILL = 100
+# hits an unlimited search puts in order up front, the rest waits until it is looked at
+RANK_CHUNK = 200
+
+_WORD = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return _WORD.findall(normalize_name(text))
+
+
+def osa_distance(a, b, max_distance=None):
+    # edit distance where swapping two neighbour letters counts as one typo
+    if a == b:
+        return 0
+    if max_distance is not None and abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous = None
+    row = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            cost = 0 if ca == cb else 1
+            value = min(row[j] + 1, current[j - 1] + 1, row[j - 1] + cost)
+            if previous is not None and i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                value = min(value, previous[j - 2] + 1)
+            current.append(value)
+        if max_distance is not None and min(current) > max_distance:
+            return max_distance + 1
+        previous, row = row, current
+    return row[-1]
+
+
+def token_similarity(query_token, name_token):
+    if name_token.startswith(query_token):
+        # still typing the word
+        return 1.0
+    longest = max(len(query_token), len(name_token))
+    max_distance = longest // 3
+    distance = osa_distance(query_token, name_token, max_distance)
+    if distance > max_distance:
+        return 0.0
+    return 1.0 - distance / longest
+
+
+def fuzzy_score(query_tokens, name_tokens, memo=None):
+    # every query word is matched to its closest word in the name on its own,
+    # so "knight hollow" finds "Hollow Knight" just as well.
+    # memo caches word pair similarities, names repeat the same words a lot
+    if not query_tokens or not name_tokens:
+        return 0.0
+    if memo is None:
+        memo = {}
+    total = 0.0
+    weight = 0
+    for query_token in query_tokens:
+        best = 0.0
+        for name_token in name_tokens:
+            pair = (query_token, name_token)
+            similarity = memo.get(pair)
+            if similarity is None:
+                similarity = memo[pair] = token_similarity(query_token, name_token)
+            if similarity > best:
+                best = similarity
+        total += best * len(query_token)
+        weight += len(query_token)
+    score = total / weight
+    # prefer names without a pile of extra words ("Hollow Knight" over "Hollow Knight Soundtrack")
+    extra = max(0, len(name_tokens) - len(query_tokens))
+    return score - 0.01 * extra
+
+
+def substring_rank(query, key):
+    # 0 exact, 1 prefix, 2 at a word start, 3 anywhere else
+    if key == query:
+        return 0
+    at = key.find(query)
+    if at == 0:
+        return 1
+    if at > 0 and not key[at - 1].isalnum():
+        return 2
+    return 3
+
+
+class SearchEngine:
+    # combines the exact substring filter with ranking and fuzzy fallback,
+    # all over one TrigramIndex
+
+    def __init__(self, index):
+        self.index = index
+        self.filter = IncrementalFilter(index)
+        # current players by position (an array, see Catalog.set_popularity); among equally
+        # good matches the more played game comes first
+        self.popularity = None
+
+    @timed('search_seconds')
+    def search(self, query, limit=500, should_stop=None, only=None):
+        # best `limit` positions for query, most relevant first, or None when abandoned.
+        # limit=None returns every substring hit, as RankedHits once there are more than
+        # FUZZY_FILL of them; typo matches are only added below that (scoring candidates is
+        # the expensive part). only is a per position mask restricting the results, see
+        # TrigramIndex.search
+        hits = self.filter.search(query, should_stop=should_stop, only=only)
+        if hits is None:
+            return None
+        if limit is None and len(hits) > FUZZY_FILL:
+            return RankedHits(hits, self.rank_key(query))
+        ranked = self.rank_hits(query, hits, limit)
+        remaining = FUZZY_FILL - len(ranked) if limit is None else limit - len(ranked)
+        if remaining > 0:
+            seen = set(ranked)
+            fuzzy = self.fuzzy(query, remaining, exclude=seen, only=only)
+            ranked.extend(position for _, position in fuzzy)
+        return ranked
+
+    def rank_key(self, query):
+        query = query.lower()
+        key = self.index.key
+        players = self.players
+
+        def rank(position):
+            name_key = key(position)
+            return substring_rank(query, name_key), -players(position), len(name_key), position
+
+        return rank
+
+    def rank_hits(self, query, hits, limit):
+        rank = self.rank_key(query)
+        if limit is None:
+            return sorted(hits, key=rank)
+        # nsmallest keeps a heap of `limit` entries instead of sorting every hit
+        return heapq.nsmallest(limit, hits, key=rank)
+
+    def players(self, position):
+        popularity = self.popularity
+        if popularity is None or position >= len(popularity):
+            return 0
+        return popularity[position]
+
+    def candidates(self, query_key, count=FUZZY_CANDIDATES):
+        # positions sharing the most trigrams with the query, cheap stand-in for the real score
+        grams = trigrams(query_key)
+        for token in query_key.split():
+            # pad words so short ones and word edges still produce trigrams
+            grams |= trigrams(f' {token} ')
+        overlap = Counter()
+        postings = self.index.postings
+        for gram in grams:
+            posting = postings.get(gram)
+            if posting is not None:
+                overlap.update(posting)
+        if not overlap:
+            return []
+        needed = max(1, len(grams) // 4)
+        best = heapq.nlargest(count, overlap.items(), key=itemgetter(1))
+        return [position for position, shared in best if shared >= needed]
+
+    @timed('fuzzy_seconds')
+    def fuzzy(self, query, limit, exclude=(), only=None):
+        # [(score, position)] of the best typo tolerant matches, best first
+        query_key = normalize_name(query)
+        query_tokens = tokenize(query_key)
+        if len(query_key) < 3 or not query_tokens or limit <= 0:
+            return []
+        key = self.index.key
+        players = self.players
+        heap = []
+        memo = {}
+        for position in self.candidates(query_key):
+            if position in exclude or (only is not None and not only[position]):
+                continue
+            name_key = key(position)
+            score = fuzzy_score(query_tokens, tokenize(name_key), memo)
+            if score < MIN_FUZZY_SCORE:
+                continue
+            # ties go to the more played game, the shorter name, then catalog order
+            entry = (score, players(position), -len(name_key), -position)
+            if len(heap) < limit:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+        heap.sort(reverse=True)
+        return [(score, -negative_position) for score, _, _, negative_position in heap]
+
+
+class RankedHits:
+    # every substring hit of a search, put in order only as far as it is read: the first
+    # RANK_CHUNK right away, then twice as many as are ranked so far whenever an index past
+    # them is asked for. supports len() and indexing (slices too), like the list it stands in for
+
+    def __init__(self, hits, rank, first=RANK_CHUNK):
+        self.rank = rank
+        self.ranked = []
+        # not ranked yet, in no particular order
+        self.rest = list(hits)
+        self.rank_more(first)
+
+    def __len__(self):
+        return len(self.ranked) + len(self.rest)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            end = index.indices(len(self))[1] if index.step is None or index.step > 0 else len(self)
+            self.rank_up_to(end)
+            return self.ranked[index]
+        if index < 0:
+            index += len(self)
+            if index < 0:
+                raise IndexError('RankedHits index out of range')
+        self.rank_up_to(index + 1)
+        return self.ranked[index]
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def rank_up_to(self, end):
+        if end > len(self.ranked) and self.rest:
+            self.rank_more(max(end - len(self.ranked), len(self.ranked)))
+
+    def rank_more(self, count):
+        # the keys end with the position, so no hit left behind can rank before these
+        if count >= len(self.rest):
+            self.ranked.extend(sorted(self.rest, key=self.rank))
+            self.rest = []
+            return
+        best = heapq.nsmallest(count, self.rest, key=self.rank)
+        taken = set(best)
+        self.ranked.extend(best)
+        self.rest = [position for position in self.rest if position not in taken]
@@ -0,0 +1,177 @@
+# player count history: raw samples plus minute / hour / day rollups in one sqlite file
+import os
+import sqlite3
+import threading
+import time
+
+from .paths import default_cache_dir
+from .players import fetch_player_counts
+
+HISTORY_FILE = 'history.sqlite'
+MINUTE = 60
+HOUR = 60 * 60
+DAY = 24 * 60 * 60
+RESOLUTIONS = (MINUTE, HOUR, DAY)
+# how long each level is kept; None keeps it forever. raw samples are only needed until
+# their minute rollup exists, the rollups are what queries read
+RETENTION = {
+    0: DAY,
+    MINUTE: 2 * DAY,
+    HOUR: 90 * DAY,
+    DAY: None,
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    appid INTEGER NOT NULL,
+    ts INTEGER NOT NULL,
+    player_count INTEGER NOT NULL,
+    PRIMARY KEY (appid, ts)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rollups (
+    appid INTEGER NOT NULL,
+    resolution INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    low INTEGER NOT NULL,
+    high INTEGER NOT NULL,
+    total INTEGER NOT NULL,
+    n INTEGER NOT NULL,
+    PRIMARY KEY (appid, resolution, bucket)
+) WITHOUT ROWID;
+"""
+
+_UPSERT_ROLLUP = """
+INSERT INTO rollups (appid, resolution, bucket, low, high, total, n) VALUES (?, ?, ?, ?, ?, ?, 1)
+ON CONFLICT (appid, resolution, bucket) DO UPDATE SET
+    low = MIN(low, excluded.low),
+    high = MAX(high, excluded.high),
+    total = total + excluded.total,
+    n = n + 1
+"""
+
+
+class HistoryStore:
+    # every sample updates its minute, hour and day rollup as it is written,
+    # so range queries never have to look at raw samples
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(default_cache_dir(), HISTORY_FILE)
+        folder = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(folder, exist_ok=True)
+        # shared between the ui thread and refresh workers, the lock serializes them
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.executescript(_SCHEMA)
+        self.lock = threading.Lock()
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+    def record(self, counts, ts=None):
+        # counts is {appid: player_count} or (appid, player_count) pairs, None counts are skipped.
+        # returns how many samples were stored
+        ts = int(ts if ts is not None else time.time())
+        if isinstance(counts, dict):
+            counts = counts.items()
+        rows = [(appid, player_count) for appid, player_count in counts if player_count is not None]
+        if not rows:
+            return 0
+        with self.lock, self.db:
+            # an appid already sampled in this second keeps its first sample; only samples
+            # actually stored go into the rollups, or averages would count them twice
+            stored = [(appid, player_count) for appid, player_count in rows
+                      if self.db.execute('INSERT OR IGNORE INTO samples VALUES (?, ?, ?)',
+                                         (appid, ts, player_count)).rowcount]
+            self.db.executemany(_UPSERT_ROLLUP, [
+                (appid, resolution, ts - ts % resolution, player_count, player_count, player_count)
+                for appid, player_count in stored
+                for resolution in RESOLUTIONS
+            ])
+        return len(stored)
+
+    def compact(self, now=None):
+        # drop everything older than its level's retention
+        now = int(now if now is not None else time.time())
+        with self.lock, self.db:
+            self.db.execute('DELETE FROM samples WHERE ts < ?', (now - RETENTION[0],))
+            for resolution in RESOLUTIONS:
+                keep = RETENTION[resolution]
+                if keep is not None:
+                    self.db.execute('DELETE FROM rollups WHERE resolution = ? AND bucket < ?',
+                                    (resolution, now - keep))
+
+    def resolution_for(self, since, now=None):
+        # finest rollup level that still covers the whole range
+        now = now if now is not None else time.time()
+        for resolution in RESOLUTIONS:
+            keep = RETENTION[resolution]
+            if keep is None or since >= now - keep + resolution:
+                return resolution
+        return RESOLUTIONS[-1]
+
+    def _aggregate(self, expression, appid, since, until, resolution):
+        until = until if until is not None else time.time()
+        resolution = resolution or self.resolution_for(since)
+        # buckets overlapping the range, the edges are rounded out to whole buckets
+        with self.lock:
+            row = self.db.execute(
+                f'SELECT {expression} FROM rollups '
+                'WHERE appid = ? AND resolution = ? AND bucket > ? AND bucket <= ?',
+                (appid, resolution, since - resolution, until),
+            ).fetchone()
+        return row
+
+    def peak(self, appid, since, until=None, resolution=None):
+        # highest count seen in [since, until], None without data
+        return self._aggregate('MAX(high)', appid, since, until, resolution)[0]
+
+    def low(self, appid, since, until=None, resolution=None):
+        return self._aggregate('MIN(low)', appid, since, until, resolution)[0]
+
+    def average(self, appid, since, until=None, resolution=None):
+        total, n = self._aggregate('SUM(total), SUM(n)', appid, since, until, resolution)
+        return total / n if n else None
+
+    def series(self, appid, since, until=None, resolution=None):
+        # [(bucket start, low, high, average)] for charts
+        until = until if until is not None else time.time()
+        resolution = resolution or self.resolution_for(since)
+        with self.lock:
+            rows = self.db.execute(
+                'SELECT bucket, low, high, CAST(total AS REAL) / n FROM rollups '
+                'WHERE appid = ? AND resolution = ? AND bucket > ? AND bucket <= ? ORDER BY bucket',
+                (appid, resolution, since - resolution, until),
+            ).fetchall()
+        return rows
+
+
+class Recorder:
+    # samples a watchlist of appids every `interval` seconds into a HistoryStore
+
+    def __init__(self, store, appids, interval=MINUTE, fetch=fetch_player_counts):
+        self.store = store
+        self.appids = list(appids)
+        self.interval = interval
+        self.fetch = fetch
+        self.stop_event = threading.Event()
+
+    def sample_once(self):
+        counts = self.fetch(self.appids)
+        return self.store.record(counts)
+
+    def run(self, on_sample=None):
+        # blocks until stop() is called; compacts the store once an hour
+        next_compact = 0
+        while not self.stop_event.is_set():
+            started = time.monotonic()
+            recorded = self.sample_once()
+            if on_sample is not None:
+                on_sample(recorded)
+            if started >= next_compact:
+                self.store.compact()
+                next_compact = started + HOUR
+            self.stop_event.wait(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def stop(self):
+        self.stop_event.set()
@@ -0,0 +1,196 @@
+# lookup structures built once when the app list is loaded
+from array import array
+
+# marks that steam likes to put in names, "Portal 2™" should match "portal 2"
+_STRIP_MARKS = str.maketrans('', '', '™®')
+# how many names a scan checks between two looks at its should_stop callback
+SCAN_CHUNK = 4096
+
+
+def normalize_name(name):
+    return name.translate(_STRIP_MARKS).casefold().strip()
+
+
+class NameIndex:
+    # normalized name -> appid, or a sorted tuple of appids when several apps share a name
+
+    def __init__(self, apps=()):
+        self.names = {}
+        for app in apps:
+            self.add(app.get('appid'), app.get('name', ''))
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, appid, name):
+        key = normalize_name(name)
+        if not key or appid is None:
+            return
+        current = self.names.get(key)
+        if current is None:
+            self.names[key] = appid
+        elif isinstance(current, tuple):
+            if appid not in current:
+                self.names[key] = tuple(sorted(current + (appid,)))
+        elif current != appid:
+            self.names[key] = tuple(sorted((current, appid)))
+
+    def lookup(self, name):
+        # every appid with exactly this (normalized) name, lowest first
+        found = self.names.get(normalize_name(name))
+        if found is None:
+            return ()
+        if isinstance(found, tuple):
+            return found
+        return (found,)
+
+    def remove(self, appid, name):
+        key = normalize_name(name)
+        current = self.names.get(key)
+        if current is None:
+            return
+        if isinstance(current, tuple):
+            rest = tuple(known for known in current if known != appid)
+            if len(rest) > 1:
+                self.names[key] = rest
+            elif rest:
+                self.names[key] = rest[0]
+            else:
+                del self.names[key]
+        elif current == appid:
+            del self.names[key]
+
+    def find_appid(self, name):
+        # duplicates resolve to the lowest appid, which is the original release
+        # in almost every case (re-releases, test apps and demos come later)
+        found = self.lookup(name)
+        return found[0] if found else None
+
+
+class TrigramIndex:
+    # inverted index from every 3 character slice of a lowercased name to the
+    # positions of the apps containing it, so substring search only has to check
+    # apps that share the rarest slices of the query.
+    # keys are name.lower() on purpose: results are the same as `query.lower() in name.lower()`.
+    # they are kept utf-8 encoded back to back in one buffer; utf-8 never matches in the
+    # middle of a character, so a byte substring test gives the same answer as a str one
+
+    def __init__(self, names=()):
+        self.key_data = bytearray()
+        self.key_offsets = array('I', (0,))
+        # arrays take 4 bytes per entry instead of a pointer to an int object
+        self.postings = {}
+        # positions of removed names, see remove()
+        self.removed = set()
+        for name in names:
+            self.add(name)
+
+    def add(self, name):
+        # positions are handed out in order, so every posting list stays sorted
+        position = len(self)
+        key = name.lower()
+        self.key_data += key.encode('utf-8')
+        self.key_offsets.append(len(self.key_data))
+        postings = self.postings
+        for gram in trigrams(key):
+            bucket = postings.get(gram)
+            if bucket is None:
+                postings[gram] = array('I', (position,))
+            else:
+                bucket.append(position)
+        return position
+
+    def remove(self, position):
+        # the key is blanked in place with NUL bytes, which no query contains, so the
+        # substring check never matches it again; posting lists keep the position, only
+        # the answer straight from a posting list has to skip it
+        start, end = self.key_offsets[position], self.key_offsets[position + 1]
+        self.key_data[start:end] = bytes(end - start)
+        self.removed.add(position)
+
+    def __len__(self):
+        return len(self.key_offsets) - 1
+
+    def key(self, position):
+        return self.key_data[self.key_offsets[position]:self.key_offsets[position + 1]].decode('utf-8')
+
+    def search(self, query, limit=None, should_stop=None, only=None):
+        # positions of all names containing query, in catalog order.
+        # should_stop is polled while scanning, a None result means the search was abandoned.
+        # only is a per position mask (bytes or bytearray), positions where it is 0 are
+        # dropped before any name is looked at
+        query = query.lower()
+        if len(query) < 3:
+            positions = range(len(self))
+            if only is not None:
+                positions = [position for position in positions if only[position]]
+            return self.scan(query, positions, limit, should_stop)
+
+        grams = trigrams(query)
+        postings = []
+        for gram in grams:
+            posting = self.postings.get(gram)
+            if posting is None:
+                return []
+            postings.append(posting)
+        postings.sort(key=len)
+
+        if len(postings) == 1 and len(query) == 3 and not self.removed:
+            # a single trigram query is exactly its posting list
+            found = postings[0] if only is None else [position for position in postings[0] if only[position]]
+            return list(found[:limit]) if limit else list(found)
+
+        candidates = postings[0]
+        if len(postings) > 1 and len(candidates) > 32:
+            candidates = set(candidates)
+            for posting in postings[1:]:
+                candidates.intersection_update(posting)
+                if len(candidates) <= 32:
+                    break
+            candidates = sorted(candidates)
+        if only is not None:
+            candidates = [position for position in candidates if only[position]]
+        # sharing every trigram does not guarantee the slices are adjacent, check for real
+        return self.scan(query, candidates, limit, should_stop)
+
+    def scan(self, query, positions, limit=None, should_stop=None):
+        needle = query.lower().encode('utf-8')
+        data = self.key_data
+        offsets = self.key_offsets
+        found = []
+        for checked, position in enumerate(positions):
+            if should_stop is not None and checked % SCAN_CHUNK == 0 and should_stop():
+                return None
+            if data.find(needle, offsets[position], offsets[position + 1]) >= 0:
+                found.append(position)
+                if limit and len(found) >= limit:
+                    break
+        return found
+
+
+class IncrementalFilter:
+    # substring filter that narrows the previous result when the new query
+    # contains the old one ("hollo" -> "hollow" only re-checks the "hollo" matches)
+
+    def __init__(self, index):
+        self.index = index
+        # (query, mask, positions) of the last search that ran to the end
+        self.last = None
+
+    def search(self, query, should_stop=None, only=None):
+        query = query.lower()
+        last = self.last
+        if last is not None and last[0] in query and last[1] is only:
+            found = self.index.scan(query, last[2], should_stop=should_stop)
+        else:
+            found = self.index.search(query, should_stop=should_stop, only=only)
+        if found is not None:
+            self.last = (query, only, found)
+        return found
+
+    def reset(self):
+        self.last = None
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
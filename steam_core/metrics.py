@@ -0,0 +1,215 @@
+# counters and latency histograms for the hot paths (app list load and parse, steam
+# requests, lookups, filtering, rendering), exported as prometheus text or json lines.
+# off unless ONLINE_STEAM_METRICS is set or something turns it on (the stats panel,
+# the server); while off every hook is a single attribute check
+import functools
+import json
+import os
+import threading
+import time
+
+# upper bounds in seconds, the last bucket catches everything slower
+BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+           float('inf'))
+
+
+class Histogram:
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, fraction):
+        # estimated from the buckets, interpolating inside the one the rank falls into,
+        # never above the slowest observation
+        if not self.count:
+            return None
+        return min(self._bucket_percentile(fraction), self.max)
+
+    def _bucket_percentile(self, fraction):
+        rank = fraction * self.count
+        seen = 0
+        lower = 0.0
+        for bound, count in zip(BUCKETS, self.counts):
+            if count and seen + count >= rank:
+                if bound == float('inf'):
+                    return lower
+                return lower + (bound - lower) * (rank - seen) / count
+            seen += count
+            lower = bound
+        return lower
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    def __init__(self, registry, name, labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.observe(self.name, time.perf_counter() - self.started, **self.labels)
+        return False
+
+
+class Metrics:
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def increment(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def timer(self, name, **labels):
+        # with metrics.timer('x_seconds'): ...
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name, labels)
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def snapshot(self):
+        # plain data: {'counters': [...], 'histograms': [...]}, each entry with name and labels
+        with self.lock:
+            counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                        for (name, labels), value in sorted(self.counters.items())]
+            histograms = [{
+                'name': name,
+                'labels': dict(labels),
+                'count': histogram.count,
+                'sum': histogram.sum,
+                'p50': histogram.percentile(0.5),
+                'p95': histogram.percentile(0.95),
+                'p99': histogram.percentile(0.99),
+                'max': histogram.max,
+                'buckets': list(histogram.counts),
+            } for (name, labels), histogram in sorted(self.histograms.items())]
+        return {'counters': counters, 'histograms': histograms}
+
+    def json_line(self):
+        snapshot = self.snapshot()
+        snapshot['ts'] = time.time()
+        return json.dumps(snapshot)
+
+    def prometheus_text(self, prefix='online_steam_'):
+        lines = []
+        snapshot = self.snapshot()
+        typed = set()
+        for counter in snapshot['counters']:
+            name = prefix + counter['name']
+            if name not in typed:
+                lines.append(f'# TYPE {name} counter')
+                typed.add(name)
+            lines.append(f"{name}{_labels(counter['labels'])} {counter['value']}")
+        for histogram in snapshot['histograms']:
+            name = prefix + histogram['name']
+            if name not in typed:
+                lines.append(f'# TYPE {name} histogram')
+                typed.add(name)
+            cumulative = 0
+            for bound, count in zip(BUCKETS, histogram['buckets']):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else f'{bound:g}'
+                lines.append(f"{name}_bucket{_labels(histogram['labels'], le=le)} {cumulative}")
+            lines.append(f"{name}_sum{_labels(histogram['labels'])} {histogram['sum']:.6f}")
+            lines.append(f"{name}_count{_labels(histogram['labels'])} {histogram['count']}")
+        return '\n'.join(lines) + '\n'
+
+    def summary_lines(self):
+        # short human readable lines, for the stats panel and the end of a batch run
+        snapshot = self.snapshot()
+        lines = []
+        for histogram in snapshot['histograms']:
+            lines.append(f"{_display_name(histogram)}: {histogram['count']}x "
+                         f"p50 {_ms(histogram['p50'])} p95 {_ms(histogram['p95'])}")
+        for counter in snapshot['counters']:
+            lines.append(f"{_display_name(counter)}: {counter['value']}")
+        return lines
+
+
+def _labels(labels, **extra):
+    labels = dict(labels, **extra)
+    if not labels:
+        return ''
+    inner = ','.join(f'{key}="{str(value)}"' for key, value in labels.items())
+    return '{' + inner + '}'
+
+
+def _display_name(entry):
+    name = entry['name']
+    for suffix in ('_seconds', '_total'):
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+    if entry['labels']:
+        name += ' ' + ','.join(str(value) for value in entry['labels'].values())
+    return name
+
+
+def _ms(seconds):
+    return '-' if seconds is None else f'{seconds * 1000:.1f}ms'
+
+
+def timed(name):
+    # decorator version of metrics.timer for whole functions
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return fn(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                metrics.observe(name, time.perf_counter() - started)
+        return wrapper
+    return decorate
+
+
+# one registry per process
+metrics = Metrics(enabled=bool(os.environ.get('ONLINE_STEAM_METRICS')))
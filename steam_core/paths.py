@@ -0,0 +1,51 @@
+import os
+import tempfile
+
+STEAM_API_URL = "https://api.steampowered.com"
+STEAM_STORE_URL = "https://store.steampowered.com"
+
+
+def api_url(path=''):
+    # steam web api base, ONLINE_STEAM_API_URL points every front end at a local
+    # `python -m steam_core serve` (or a test stub) instead
+    base = os.environ.get('ONLINE_STEAM_API_URL') or STEAM_API_URL
+    return base.rstrip('/') + path
+
+
+def store_url(path=''):
+    # steam store api base (appdetails), ONLINE_STEAM_STORE_URL overrides it
+    base = os.environ.get('ONLINE_STEAM_STORE_URL') or STEAM_STORE_URL
+    return base.rstrip('/') + path
+
+
+def default_cache_dir():
+    # pick a per-user cache folder, can be overridden with ONLINE_STEAM_CACHE_DIR
+    override = os.environ.get('ONLINE_STEAM_CACHE_DIR')
+    if override:
+        return override
+    if os.name == 'nt':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'online-steam')
+
+
+def atomic_write(path, data):
+    # write to a temp file in the same folder and rename it over the target,
+    # so readers never see a half written file
+    folder = os.path.dirname(os.path.abspath(path))
+    os.makedirs(folder, exist_ok=True)
+    mode = 'wb' if isinstance(data, bytes) else 'w'
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix='.tmp-', suffix=os.path.basename(path))
+    try:
+        with os.fdopen(fd, mode) as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,204 @@
+# current player counts from the steam web api
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .metrics import metrics, timed
+from .paths import api_url
+from .scheduler import steam_get
+
+PLAYER_COUNT_PATH = "/ISteamUserStats/GetNumberOfCurrentPlayers/v1/"
+# enough to hide network latency without looking like a flood to steam
+DEFAULT_CONCURRENCY = 8
+# counts move slowly, looking at the same game again within this many seconds reuses the last answer
+DEFAULT_TTL = 30
+DEFAULT_CACHE_SIZE = 1024
+# steam answers 404 with {"response": {"result": 42}} for apps it has no count for
+NO_DATA_RESULT = 42
+
+
+@timed('player_count_fetch_seconds')
+def fetch_player_count(appid, timeout=10, base_url=None, scheduler=None):
+    # None when steam has no count for the app (unreleased games, tools, soundtracks...).
+    # goes through the shared request scheduler unless given another one
+    url = (base_url.rstrip('/') + PLAYER_COUNT_PATH) if base_url else api_url(PLAYER_COUNT_PATH)
+    get = scheduler.get if scheduler is not None else steam_get
+    response = get(url, params={'appid': appid}, timeout=timeout)
+    if response.status_code == 404 and _no_data(response):
+        return None
+    response.raise_for_status()
+    data = response.json()
+    return data.get('response', {}).get('player_count')
+
+
+def _no_data(response):
+    # only steam's own answer means "no count"; any other 404 (a wrong base url, an html
+    # error page) is an error, or it would be cached and swept as an app without players
+    try:
+        data = response.json()
+    except ValueError:
+        return False
+    return isinstance(data, dict) and (data.get('response') or {}).get('result') == NO_DATA_RESULT
+
+
+class SingleFlight:
+    # concurrent calls with the same key share one execution: the first caller runs fn,
+    # everyone arriving while it runs waits for and gets the same result (or exception)
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def do(self, key, fn, *args):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn(*args)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+
+    def in_flight(self):
+        with self.lock:
+            return len(self.calls)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class PlayerCountCache:
+    # appid -> (player_count, fetched_at), least recently used entries are dropped past max_size.
+    # with stale_while_revalidate > 0 an expired entry younger than ttl + stale_while_revalidate
+    # is still returned right away while a background thread fetches the new count
+
+    def __init__(self, ttl=DEFAULT_TTL, max_size=DEFAULT_CACHE_SIZE, stale_while_revalidate=0,
+                 fetch=fetch_player_count):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.stale_while_revalidate = stale_while_revalidate
+        self.fetch = fetch
+        self.entries = OrderedDict()
+        self.revalidating = set()
+        self.lock = threading.Lock()
+        # misses for the same appid at the same moment go upstream once
+        self.flight = SingleFlight()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def peek(self, appid):
+        # cached (player_count, age in seconds) or None, never touches the network
+        with self.lock:
+            entry = self.entries.get(appid)
+        if entry is None:
+            return None
+        return entry[0], time.monotonic() - entry[1]
+
+    def put(self, appid, player_count):
+        with self.lock:
+            self.entries[appid] = (player_count, time.monotonic())
+            self.entries.move_to_end(appid)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, appid=None):
+        with self.lock:
+            if appid is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(appid, None)
+
+    def get(self, appid, timeout=10):
+        with self.lock:
+            entry = self.entries.get(appid)
+            if entry is not None:
+                self.entries.move_to_end(appid)
+        if entry is not None:
+            player_count, fetched_at = entry
+            age = time.monotonic() - fetched_at
+            if age < self.ttl:
+                metrics.increment('player_count_cache_total', result='hit')
+                return player_count
+            if age < self.ttl + self.stale_while_revalidate:
+                metrics.increment('player_count_cache_total', result='stale')
+                self.revalidate(appid, timeout)
+                return player_count
+        metrics.increment('player_count_cache_total', result='miss')
+        # errors are not cached, the next look will try again
+        return self.flight.do(appid, self.fetch_and_store, appid, timeout)
+
+    def fetch_and_store(self, appid, timeout):
+        player_count = self.fetch(appid, timeout)
+        self.put(appid, player_count)
+        return player_count
+
+    def revalidate(self, appid, timeout):
+        with self.lock:
+            if appid in self.revalidating:
+                return
+            self.revalidating.add(appid)
+
+        def refresh():
+            try:
+                self.flight.do(appid, self.fetch_and_store, appid, timeout)
+            except Exception:
+                # keep serving the stale count, it expires on its own
+                pass
+            finally:
+                with self.lock:
+                    self.revalidating.discard(appid)
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+
+# shared by everything in the process, so a lookup in one place warms the others
+player_count_cache = PlayerCountCache()
+
+
+def get_player_count(appid, timeout=10, cache=None):
+    # cached version of fetch_player_count
+    return (cache if cache is not None else player_count_cache).get(appid, timeout)
+
+
+def fetch_player_counts(appids, on_result=None, max_workers=DEFAULT_CONCURRENCY, timeout=10,
+                        cache=None):
+    # fetch many counts at once with at most max_workers requests in flight.
+    # on_result(appid, player_count, error) is called as soon as each one finishes,
+    # on the calling thread; the full {appid: player_count} dict is returned at the end
+    appids = list(dict.fromkeys(appids))
+    results = {}
+    if not appids:
+        return results
+    cache = cache if cache is not None else player_count_cache
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(appids))) as pool:
+        futures = {pool.submit(cache.get, appid, timeout): appid for appid in appids}
+        for future in as_completed(futures):
+            appid = futures[future]
+            try:
+                player_count = future.result()
+                error = None
+            except Exception as e:
+                player_count = None
+                error = e
+            results[appid] = player_count
+            if on_result is not None:
+                on_result(appid, player_count, error)
+    return results
@@ -0,0 +1,238 @@
+# every request to steam goes through one scheduler: a token bucket keeps the request
+# rate at what steam tolerates, throttling and server errors are retried with exponential
+# backoff and jitter, and a circuit breaker stops hammering steam while it is down
+import random
+import threading
+import time
+
+import requests
+
+from .metrics import metrics
+
+# steam does not publish limits, these stay well clear of where 429s start
+DEFAULT_RATE = 20
+DEFAULT_BURST = 40
+MIN_RATE = 0.5
+DEFAULT_RETRIES = 4
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30
+FAILURE_THRESHOLD = 5
+RESET_TIMEOUT = 30
+
+
+class SteamAPIError(requests.exceptions.RequestException):
+    pass
+
+
+class RateLimitedError(SteamAPIError):
+    # steam kept answering 429 after every retry
+    pass
+
+
+class CircuitOpenError(SteamAPIError):
+    # too many failures in a row, requests fail fast until the breaker lets a probe through
+    pass
+
+
+class TokenBucket:
+    # `rate` tokens per second up to `burst`; the rate adapts: it is halved whenever
+    # steam throttles us and creeps back towards max_rate with every success
+
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST, min_rate=MIN_RATE):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self):
+        # takes a token and returns 0 when a request may go out now, otherwise returns how
+        # long to wait before asking again
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now >= self.paused_until and self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return max(self.paused_until - now, (1 - self.tokens) / self.rate)
+
+    def acquire(self):
+        # blocks until a request may go out, returns how long it waited
+        waited = 0.0
+        while True:
+            delay = self.reserve()
+            if not delay:
+                return waited
+            time.sleep(delay)
+            waited += delay
+
+    def throttled(self, pause=0.0):
+        # multiplicative decrease, and nothing goes out for `pause` seconds
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = min(self.tokens, 0)
+            self.paused_until = max(self.paused_until, time.monotonic() + pause)
+
+    def succeeded(self):
+        # additive increase
+        with self.lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 50)
+
+
+class CircuitBreaker:
+    # closed: requests go through. after `threshold` failures in a row it opens and
+    # requests fail right away; after `reset_timeout` one probe is let through
+    # (half open) and its outcome closes or re-opens the breaker
+
+    def __init__(self, threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if self.probing or time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def before(self):
+        with self.lock:
+            if self.opened_at is None:
+                return
+            remaining = self.reset_timeout - (time.monotonic() - self.opened_at)
+            if remaining > 0 or self.probing:
+                raise CircuitOpenError(f"Steam API unavailable, retrying in {max(remaining, 1):.0f}s")
+            self.probing = True
+
+    def success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self.probing = False
+
+
+class RequestScheduler:
+
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST, retries=DEFAULT_RETRIES,
+                 backoff_base=BACKOFF_BASE, backoff_max=BACKOFF_MAX,
+                 failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    def backoff(self, attempt):
+        # full jitter: anywhere between 0 and the exponential cap
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def get(self, url, **kwargs):
+        # same arguments as requests.get; returns the response once it is not a 429 / 5xx,
+        # other statuses (304, 404...) are left to the caller
+        attempt = 0
+        while True:
+            try:
+                self.breaker.before()
+            except CircuitOpenError:
+                metrics.increment('steam_circuit_open_total')
+                raise
+            waited = self.bucket.acquire()
+            if waited:
+                metrics.observe('rate_limit_wait_seconds', waited)
+            started = time.perf_counter()
+            try:
+                response = requests.get(url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                metrics.increment('steam_requests_total', status=type(e).__name__)
+                self.breaker.failure()
+                if attempt >= self.retries:
+                    raise
+                metrics.increment('steam_retries_total')
+                time.sleep(self.backoff(attempt))
+                attempt += 1
+                continue
+            # time to the response headers, a streamed body is read by the caller
+            metrics.observe('steam_request_seconds', time.perf_counter() - started)
+            metrics.increment('steam_requests_total', status=response.status_code)
+
+            if response.status_code == 429 or response.status_code >= 500:
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                if response.status_code == 429:
+                    # throttling says nothing about steam being down, only slow down
+                    self.bucket.throttled(retry_after or 0.0)
+                else:
+                    self.breaker.failure()
+                if attempt >= self.retries:
+                    response.close()
+                    if response.status_code == 429:
+                        raise RateLimitedError("Steam is rate limiting requests, try again shortly",
+                                               response=response)
+                    raise SteamAPIError(f"Steam API error {response.status_code}", response=response)
+                response.close()
+                metrics.increment('steam_retries_total')
+                time.sleep(max(retry_after or 0.0, self.backoff(attempt)))
+                attempt += 1
+                continue
+
+            self.breaker.success()
+            self.bucket.succeeded()
+            return response
+
+
+def parse_retry_after(value):
+    # seconds to wait from a Retry-After header (delta seconds or http date), None if absent
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    # only needed for the rare http date form
+    from email.utils import parsedate_to_datetime
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+# one scheduler for the whole process, all steam calls share its rate budget
+request_scheduler = RequestScheduler()
+
+
+def steam_get(url, **kwargs):
+    return request_scheduler.get(url, **kwargs)
+
+
+def describe_error(error):
+    # short message for the user instead of the raw exception text
+    if isinstance(error, SteamAPIError):
+        return str(error)
+    if isinstance(error, requests.exceptions.Timeout):
+        return "Steam did not answer in time, try again"
+    if isinstance(error, requests.exceptions.ConnectionError):
+        return "Could not reach Steam, check your connection"
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        return f"Steam answered with an error ({error.response.status_code})"
+    if isinstance(error, ValueError):
+        return "Steam sent an answer that could not be read"
+    return f"Unexpected error: {error}"
@@ -0,0 +1,194 @@
+# small local http service in front of the steam web api.
+# it mirrors the two steam endpoints the front ends use, so setting
+# ONLINE_STEAM_API_URL=http://127.0.0.1:8765 is all a front end needs, and adds
+# /search, /appid and /players for scripts. identical requests arriving together
+# are answered by one upstream call and everything is served from a shared cache.
+# /metrics exposes the process metrics in prometheus text format (or json with ?format=json)
+import json
+import os
+import threading
+import time
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from .applist import APP_LIST_PATH, AppListCache
+from .metrics import metrics
+from .paths import STEAM_API_URL, default_cache_dir
+from .players import NO_DATA_RESULT, PLAYER_COUNT_PATH, PlayerCountCache, fetch_player_count
+
+DEFAULT_PORT = 8765
+
+
+class SteamProxy:
+    # the state shared by all request threads
+
+    def __init__(self, upstream=STEAM_API_URL, cache_dir=None, ttl=30, cache_size=4096,
+                 stale_while_revalidate=30):
+        self.upstream = upstream.rstrip('/')
+        # its own cache folder, so it never serves a list written by a front end pointed at it.
+        # no delta sync: the GetAppList mirror serves the cached json with steam's etag, which
+        # changes merged into the catalog would never reach, so front ends would keep getting 304s
+        self.app_lists = AppListCache(cache_dir or os.path.join(default_cache_dir(), 'server'),
+                                      url=self.upstream + APP_LIST_PATH, delta=False)
+        self.counts = PlayerCountCache(ttl=ttl, max_size=cache_size,
+                                       stale_while_revalidate=stale_while_revalidate,
+                                       fetch=partial(fetch_player_count, base_url=self.upstream))
+        self.catalog = None
+        self.catalog_lock = threading.Lock()
+
+    def load_catalog(self, force_refresh=False):
+        with self.catalog_lock:
+            catalog = self.app_lists.load(force_refresh=force_refresh)
+            self.catalog = catalog
+            return catalog
+
+    def get_catalog(self):
+        # loaded on first use and reloaded once the cached list goes stale
+        catalog = self.catalog
+        if catalog is not None and self.app_lists.is_fresh(self.app_lists.read_meta()):
+            return catalog
+        with self.catalog_lock:
+            # looked at again under the lock: of the requests that found it stale, the
+            # first one reloads and the rest get what it loaded
+            catalog = self.catalog
+            if catalog is None or not self.app_lists.is_fresh(self.app_lists.read_meta()):
+                catalog = self.catalog = self.app_lists.load()
+            return catalog
+
+    def player_count(self, appid):
+        return self.counts.get(appid)
+
+
+class Handler(BaseHTTPRequestHandler):
+    server_version = 'OnlineSteam/1'
+    proxy = None
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+        routes = {
+            APP_LIST_PATH: self.app_list,
+            PLAYER_COUNT_PATH: self.steam_player_count,
+            '/search': self.search,
+            '/appid': self.appid,
+            '/players': self.players,
+            '/health': self.health,
+            '/metrics': self.export_metrics,
+        }
+        route = routes.get(parts.path) or routes.get(parts.path.rstrip('/') + '/')
+        if route is None:
+            self.send_json({'error': 'not found'}, 404)
+            return
+        started = time.perf_counter()
+        try:
+            route(query)
+        except ValueError as e:
+            self.send_json({'error': str(e)}, 400)
+        except Exception as e:
+            self.send_json({'error': f"upstream failed: {e}"}, 502)
+        metrics.observe('server_request_seconds', time.perf_counter() - started, route=route.__name__)
+        metrics.increment('server_requests_total', route=route.__name__)
+
+    def log_message(self, format, *args):
+        # one line per request is too chatty for a background service
+        pass
+
+    def send_json(self, data, status=200):
+        self.send_body(json.dumps(data), 'application/json; charset=utf-8', status)
+
+    def send_body(self, text, content_type, status=200):
+        body = text.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def query_appid(self, query):
+        if 'appid' in query:
+            try:
+                return int(query['appid'])
+            except ValueError:
+                raise ValueError("appid must be a number")
+        if 'name' in query:
+            appid = self.proxy.get_catalog().find_appid(query['name'])
+            if appid is None:
+                raise ValueError(f"no game named {query['name']!r}")
+            return appid
+        raise ValueError("appid or name is required")
+
+    def app_list(self, query):
+        # the cached GetAppList payload as is, with validators so clients can revalidate too
+        self.proxy.get_catalog()
+        app_lists = self.proxy.app_lists
+        etag = app_lists.read_meta().get('etag')
+        if etag and self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        size = os.path.getsize(app_lists.data_path)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(size))
+        if etag:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        with open(app_lists.data_path, 'rb') as f:
+            while True:
+                chunk = f.read(64 * 1024)
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+
+    def steam_player_count(self, query):
+        # same shape as steam's own answer
+        player_count = self.proxy.player_count(self.query_appid(query))
+        if player_count is None:
+            self.send_json({'response': {'result': NO_DATA_RESULT}})
+        else:
+            self.send_json({'response': {'player_count': player_count, 'result': 1}})
+
+    def search(self, query):
+        text = query.get('q', '')
+        limit = min(int(query.get('limit', 20)), 500)
+        catalog = self.proxy.get_catalog()
+        positions = catalog.search_engine.search(text, limit=limit) if text else []
+        self.send_json([{'appid': catalog.appid(i), 'name': catalog.name(i)} for i in positions])
+
+    def appid(self, query):
+        if 'name' not in query:
+            raise ValueError("name is required")
+        self.send_json({'name': query['name'], 'appid': self.proxy.get_catalog().find_appid(query['name'])})
+
+    def players(self, query):
+        appid = self.query_appid(query)
+        self.send_json({'appid': appid, 'player_count': self.proxy.player_count(appid)})
+
+    def health(self, query):
+        self.send_json({'status': 'ok', 'cached_counts': len(self.proxy.counts),
+                        'in_flight': self.proxy.counts.flight.in_flight()})
+
+    def export_metrics(self, query):
+        if query.get('format') == 'json':
+            self.send_json(metrics.snapshot())
+        else:
+            self.send_body(metrics.prometheus_text(), 'text/plain; version=0.0.4; charset=utf-8')
+
+
+def make_server(proxy, host='127.0.0.1', port=DEFAULT_PORT):
+    handler = type('BoundHandler', (Handler,), {'proxy': proxy})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def serve(host='127.0.0.1', port=DEFAULT_PORT, upstream=STEAM_API_URL, ttl=30, cache_dir=None):
+    # a long running service is what the metrics are for
+    metrics.enabled = True
+    proxy = SteamProxy(upstream, cache_dir=cache_dir, ttl=ttl)
+    server = make_server(proxy, host, port)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
@@ -0,0 +1,67 @@
+# startup time measurement. every run is a fresh interpreter, so imports are really paid
+# for each time, and the numbers cover what a user waits for: starting python, importing
+# the ui toolkit and steam_core, loading the catalog (from the cache when there is one)
+# and answering the first search
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+PHASES = ('imports', 'catalog', 'first_search', 'in_process', 'total')
+
+_PROBE = r"""
+import json, sys, time
+started = time.perf_counter()
+for module in sys.argv[2:]:
+    __import__(module)
+from steam_core import AppListCache
+imported = time.perf_counter()
+cache = AppListCache()
+catalog = cache.load()
+loaded = time.perf_counter()
+catalog.search_engine.search(sys.argv[1], limit=10)
+searched = time.perf_counter()
+print(json.dumps({
+    'imports': imported - started,
+    'catalog': loaded - imported,
+    'first_search': searched - loaded,
+    'in_process': searched - started,
+    'source': cache.source,
+    'games': len(catalog),
+}))
+"""
+
+
+def measure_once(modules=(), query='counter strike', cache_dir=None):
+    env = dict(os.environ)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, (root, env.get('PYTHONPATH'))))
+    if cache_dir:
+        env['ONLINE_STEAM_CACHE_DIR'] = cache_dir
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', _PROBE, query, *modules], env=env,
+                            capture_output=True, text=True)
+    total = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip()
+                           else f"probe exited with {result.returncode}")
+    sample = json.loads(result.stdout.strip().splitlines()[-1])
+    # interpreter start and exit included
+    sample['total'] = total
+    return sample
+
+
+def measure_startup(modules=(), runs=5, query='counter strike', cache_dir=None):
+    # median seconds per phase over `runs` fresh processes, plus where the catalog came from.
+    # the first run fills the cache when it is empty and is reported, not averaged
+    samples = [measure_once(modules, query, cache_dir) for _ in range(runs + 1)]
+    warmup, samples = samples[0], samples[1:]
+    summary = {phase: statistics.median(sample[phase] for sample in samples) for phase in PHASES}
+    summary['worst_total'] = max(sample['total'] for sample in samples)
+    summary['first_run_total'] = warmup['total']
+    summary['source'] = samples[-1]['source']
+    summary['games'] = samples[-1]['games']
+    summary['runs'] = runs
+    return summary
@@ -0,0 +1,203 @@
+# current players of every app in the catalog, kept as a compact snapshot that ranks
+# search suggestions by popularity. a sweep walks the appids in ascending order a batch at
+# a time and checkpoints after each batch, so an interrupted sweep picks up where it
+# stopped. apps steam has no count for (most of the catalog: dlc, soundtracks, tools...)
+# go on a skip list and are only asked about again once it is a week old
+import json
+import os
+import struct
+import sys
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+from .paths import atomic_write, default_cache_dir
+from .players import fetch_player_count
+from .scheduler import CircuitOpenError
+
+SNAPSHOT_FILE = 'players.bin'
+SKIP_FILE = 'players.skip.bin'
+CHECKPOINT_FILE = 'sweep.checkpoint.json'
+PARTIAL_FILE = 'sweep.partial.bin'
+BATCH_SIZE = 1000
+# requests in flight; the scheduler's rate limit is what really sets the pace
+DEFAULT_CONNECTIONS = 32
+SKIP_MAX_AGE = 7 * 24 * 60 * 60
+# a sweep left unfinished for longer than this is started over
+CHECKPOINT_MAX_AGE = 24 * 60 * 60
+
+# magic, taken at (unix time), number of apps, then uint32 columns (appids, counts) in
+# little endian
+_HEADER = struct.Struct('<8sdI')
+SNAPSHOT_MAGIC = b'OSPLAYR1'
+SKIP_MAGIC = b'OSSKIP01'
+
+
+def _little_endian(column):
+    if sys.byteorder == 'big':
+        column = array('I', column)
+        column.byteswap()
+    return column
+
+
+def _pack(magic, taken_at, *columns):
+    parts = [_HEADER.pack(magic, taken_at, len(columns[0]))]
+    parts.extend(_little_endian(column).tobytes() for column in columns)
+    return b''.join(parts)
+
+
+def _unpack(data, magic, columns):
+    found, taken_at, count = _HEADER.unpack_from(data)
+    if found != magic:
+        raise ValueError("not a snapshot file")
+    result = []
+    offset = _HEADER.size
+    for _ in range(columns):
+        column = array('I')
+        column.frombytes(data[offset:offset + 4 * count])
+        result.append(_little_endian(column))
+        offset += 4 * count
+    return taken_at, result
+
+
+def _read(path, magic, columns):
+    # (taken_at, columns), or (None, empty columns) when there is no usable file
+    try:
+        with open(path, 'rb') as f:
+            return _unpack(f.read(), magic, columns)
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, struct.error) as e:
+        print(f"Ignoring {os.path.basename(path)}: {e}", file=sys.stderr)
+    return None, [array('I') for _ in range(columns)]
+
+
+def save_snapshot(path, counts, taken_at=None):
+    appids = array('I', sorted(counts))
+    player_counts = array('I', (min(counts[appid], 0xFFFFFFFF) for appid in appids))
+    atomic_write(path, _pack(SNAPSHOT_MAGIC, taken_at or time.time(), appids, player_counts))
+
+
+def load_snapshot(path=None):
+    # (taken_at, {appid: player_count}) of the last finished sweep, (None, {}) without one
+    path = path or os.path.join(default_cache_dir(), SNAPSHOT_FILE)
+    taken_at, (appids, player_counts) = _read(path, SNAPSHOT_MAGIC, 2)
+    return taken_at, dict(zip(appids, player_counts))
+
+
+class Sweep:
+
+    def __init__(self, appids, cache_dir=None, scheduler=None, connections=DEFAULT_CONNECTIONS,
+                 batch_size=BATCH_SIZE, timeout=10):
+        self.appids = sorted(set(appids))
+        self.cache_dir = cache_dir or default_cache_dir()
+        # None shares the process wide rate limit
+        self.scheduler = scheduler
+        self.connections = connections
+        self.batch_size = batch_size
+        self.timeout = timeout
+        # progress of the current run, for on_progress
+        self.total = 0
+        self.done = 0
+        self.counted = 0
+        self.no_count = 0
+        self.failed = 0
+        # apps already swept by an earlier, interrupted run
+        self.resumed = 0
+
+    def path(self, name):
+        return os.path.join(self.cache_dir, name)
+
+    def read_checkpoint(self):
+        try:
+            with open(self.path(CHECKPOINT_FILE), 'r') as f:
+                checkpoint = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"Ignoring sweep checkpoint: {e}", file=sys.stderr)
+            return None
+        if time.time() - checkpoint.get('started_at', 0) > CHECKPOINT_MAX_AGE:
+            return None
+        return checkpoint
+
+    def read_partial(self, size):
+        # counts found before the checkpoint; anything written after it is cut off
+        pairs = array('I')
+        with open(self.path(PARTIAL_FILE), 'a+b') as f:
+            f.seek(0)
+            pairs.frombytes(f.read(size))
+            f.truncate(size)
+        pairs = _little_endian(pairs)
+        return dict(zip(pairs[::2], pairs[1::2]))
+
+    def fetch(self, appid):
+        # the count, None when steam has none for the app, or the exception
+        try:
+            return fetch_player_count(appid, self.timeout, scheduler=self.scheduler)
+        except Exception as e:
+            return e
+
+    def run(self, on_progress=None, restart=False):
+        # sweeps every appid not swept yet, writes the snapshot and returns it as
+        # {appid: player_count}. raises CircuitOpenError when steam stops answering,
+        # running again later resumes from the last finished batch
+        os.makedirs(self.cache_dir, exist_ok=True)
+        checkpoint = None if restart else self.read_checkpoint()
+        if checkpoint is None:
+            checkpoint = {'started_at': time.time(), 'next_appid': 0, 'partial_bytes': 0}
+        counts = self.read_partial(checkpoint['partial_bytes'])
+        self.resumed = len(counts)
+
+        skip_path = self.path(SKIP_FILE)
+        skipped_at, (skip,) = _read(skip_path, SKIP_MAGIC, 1)
+        if skipped_at is None or time.time() - skipped_at > SKIP_MAX_AGE:
+            skipped_at, skip = time.time(), array('I')
+        skip_set = set(skip)
+
+        todo = [appid for appid in self.appids
+                if appid >= checkpoint['next_appid'] and appid not in skip_set]
+        self.total = len(todo)
+        pool = ThreadPoolExecutor(max_workers=self.connections)
+        try:
+            for start in range(0, len(todo), self.batch_size):
+                batch = todo[start:start + self.batch_size]
+                results = list(pool.map(self.fetch, batch))
+                found = array('I')
+                for appid, result in zip(batch, results):
+                    if isinstance(result, CircuitOpenError):
+                        # nothing of this batch is kept, it is swept again on the next run
+                        raise result
+                    if isinstance(result, Exception):
+                        self.failed += 1
+                    elif result is None:
+                        skip.append(appid)
+                        self.no_count += 1
+                    else:
+                        counts[appid] = result
+                        found.extend((appid, min(result, 0xFFFFFFFF)))
+                        self.counted += 1
+                self.done += len(batch)
+
+                # counts first, then the checkpoint that covers them
+                with open(self.path(PARTIAL_FILE), 'ab') as f:
+                    f.write(_little_endian(found).tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+                checkpoint['next_appid'] = batch[-1] + 1
+                checkpoint['partial_bytes'] += 4 * len(found)
+                atomic_write(self.path(CHECKPOINT_FILE), json.dumps(checkpoint))
+                atomic_write(skip_path, _pack(SKIP_MAGIC, skipped_at, skip))
+                if on_progress is not None:
+                    on_progress(self)
+        finally:
+            # on ctrl+c only the requests already out are waited for
+            pool.shutdown(cancel_futures=True)
+
+        save_snapshot(self.path(SNAPSHOT_FILE), counts, checkpoint['started_at'])
+        for name in (CHECKPOINT_FILE, PARTIAL_FILE):
+            try:
+                os.remove(self.path(name))
+            except OSError:
+                pass
+        return counts
@@ -0,0 +1,75 @@
+# the streaming GetAppList parser, whatever the chunk boundaries
+import json
+import unittest
+
+from steam_core.applist import AppListParser, build_catalog
+
+APPS = [
+    {'appid': 10, 'name': 'Counter-Strike'},
+    {'appid': 570, 'name': 'Dota 2'},
+    {'appid': 620, 'name': 'Portal 2™'},
+    {'appid': 1, 'name': 'İstanbul "Drift" \\ Ǆ 東方 🐉'},
+    {'appid': 2, 'name': ''},
+    {'appid': 3},
+    {'name': 'no appid, skipped'},
+    {'appid': 4, 'name': 'nested', 'extra': {'apps': [1, 2], 'text': ']'}},
+]
+
+
+def payload(apps, indent=None):
+    return json.dumps({'applist': {'apps': apps}}, ensure_ascii=False, indent=indent).encode('utf-8')
+
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def parse(chunks):
+    parser = AppListParser()
+    apps = []
+    for chunk in chunks:
+        apps += parser.feed(chunk)
+    apps += parser.feed(b'', final=True)
+    return apps
+
+
+EXPECTED = [(app['appid'], app.get('name', '')) for app in APPS if 'appid' in app]
+
+
+class AppListParserTest(unittest.TestCase):
+
+    def test_chunk_sizes(self):
+        # 1 byte splits every utf-8 sequence and every token, 7 bytes lands all over the place
+        for indent in (None, 2):
+            data = payload(APPS, indent)
+            for size in (1, 7, 64, len(data)):
+                with self.subTest(indent=indent, size=size):
+                    self.assertEqual(parse(chunked(data, size)), EXPECTED)
+
+    def test_apps_arrive_as_their_bytes_do(self):
+        data = payload(APPS)
+        parser = AppListParser()
+        end_of_first = data.index(b'}') + 1
+        self.assertEqual(parser.feed(data[:end_of_first - 1]), [])
+        # the closing brace completes the first app, nothing more is needed
+        self.assertEqual(parser.feed(data[end_of_first - 1:end_of_first]), [EXPECTED[0]])
+        self.assertEqual(parser.feed(data[end_of_first:end_of_first + 2]), [])
+
+    def test_empty_list(self):
+        self.assertEqual(parse(chunked(payload([]), 1)), [])
+
+    def test_broken_payloads(self):
+        for data in (b'{"applist": {}}', payload(APPS)[:-10], b'<html>503</html>'):
+            with self.subTest(data=data[:20]):
+                with self.assertRaises(ValueError):
+                    parse(chunked(data, 7))
+
+    def test_build_catalog(self):
+        catalog = build_catalog(chunked(payload(APPS), 7))
+        self.assertEqual(list(catalog), EXPECTED)
+        self.assertEqual(catalog.find_appid('portal 2'), 620)
+        self.assertEqual(catalog.name(catalog.position(1)), APPS[3]['name'])
+
+
+if __name__ == '__main__':
+    unittest.main()
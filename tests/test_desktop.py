@@ -0,0 +1,118 @@
+# the textual app end to end in a headless run_test, against a stub steam
+import importlib.util
+import json
+import os
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
+
+try:
+    import textual
+except ImportError:
+    textual = None
+
+MAIN = os.path.join(os.path.dirname(__file__), '..', 'windows-linux', 'online-steam-main.py')
+APPS = [(5000, 'Dragon Quest'), (5001, 'Dragon Quest'), (730, 'Counter-Strike 2'), (7, 'Some Game')]
+APPS += [(100 + i, f'Dragon Clone {i}') for i in range(30)]
+
+
+class StubSteam(BaseHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        query = parse_qs(parts.query)
+        if 'GetAppList' in parts.path:
+            data = {'applist': {'apps': [{'appid': appid, 'name': name} for appid, name in APPS]}}
+        elif 'GetNumberOfCurrentPlayers' in parts.path:
+            data = {'response': {'player_count': int(query['appid'][0]) * 3, 'result': 1}}
+        else:
+            # the store has never heard of anything
+            data = {}
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def load_app_module():
+    spec = importlib.util.spec_from_file_location('online_steam_main', MAIN)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@unittest.skipIf(textual is None, "textual is not installed")
+class DesktopAppTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        stub = ThreadingHTTPServer(('127.0.0.1', 0), StubSteam)
+        stub.daemon_threads = True
+        threading.Thread(target=stub.serve_forever, daemon=True).start()
+        self.addCleanup(stub.server_close)
+        self.addCleanup(stub.shutdown)
+        url = f'http://127.0.0.1:{stub.server_address[1]}'
+        cache_dir = tempfile.mkdtemp()
+        with open(os.path.join(cache_dir, 'favorites.json'), 'w') as f:
+            # saved under a name the catalog no longer has
+            json.dump({'version': 1, 'favorites': [{'appid': 7, 'name': 'Renamed Game'}]}, f)
+        environment = mock.patch.dict(os.environ, {'ONLINE_STEAM_API_URL': url, 'ONLINE_STEAM_STORE_URL': url,
+                                                   'ONLINE_STEAM_CACHE_DIR': cache_dir})
+        environment.start()
+        self.addCleanup(environment.stop)
+        self.module = load_app_module()
+
+    async def wait_for(self, pilot, condition, seconds=10):
+        for _ in range(int(seconds / 0.05)):
+            if condition():
+                return
+            await pilot.pause(0.05)
+        self.fail("timed out")
+
+    def output(self, app):
+        return str(app.query_one('#output').render())
+
+    async def test_search_page_and_look_up(self):
+        app = self.module.OnlineSteam()
+        async with app.run_test(size=(140, 45)) as pilot:
+            await self.wait_for(pilot, lambda: app.catalog_ready)
+            # every app, as after F3: games only would ask the rate limited store about types
+            app.games_only = False
+            results = app.filtered_games_list
+
+            app.query_one('#game_input').value = 'dragon'
+            await self.wait_for(pilot, lambda: len(results.items) == 32)
+            self.assertEqual(results.window_start, 0)
+            results.action_page(1)
+            self.assertEqual(results.window_start, app.page_size)
+
+            # two apps share the name, the selected row decides which one is looked up
+            app.query_one('#game_input').value = 'dragon quest'
+            await self.wait_for(pilot, lambda: len(results.items) == 2)
+            self.assertEqual([app.catalog.appid(position) for position in results.items], [5000, 5001])
+            results.index = 1
+            results.action_select_cursor()
+            await self.wait_for(pilot, lambda: 'players online' in self.output(app))
+            self.assertEqual(app.current_game, (5001, 'Dragon Quest'))
+            self.assertIn(f'{5001 * 3}', self.output(app))
+
+    async def test_favorite_is_looked_up_by_appid(self):
+        app = self.module.OnlineSteam()
+        async with app.run_test(size=(140, 45)) as pilot:
+            await self.wait_for(pilot, lambda: app.catalog_ready)
+            table = app.query_one('#favorites')
+            table.focus()
+            table.move_cursor(row=0)
+            table.action_select_cursor()
+            await self.wait_for(pilot, lambda: 'players online' in self.output(app))
+            self.assertEqual(app.current_game, (7, 'Some Game'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+# rollups have to agree with the raw samples they were made from
+import os
+import tempfile
+import unittest
+
+from steam_core.history import DAY, HOUR, MINUTE, HistoryStore
+
+T = 1_700_000_000 - 1_700_000_000 % DAY
+
+
+class HistoryStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store = HistoryStore(os.path.join(tempfile.mkdtemp(), 'history.sqlite'))
+        self.addCleanup(self.store.close)
+
+    def test_rollups(self):
+        for offset, player_count in ((0, 10), (30, 20), (90, 60)):
+            self.store.record({730: player_count}, ts=T + offset)
+        self.assertEqual(self.store.series(730, T, T + 120, MINUTE),
+                         [(T, 10, 20, 15.0), (T + MINUTE, 60, 60, 60.0)])
+        for resolution in (HOUR, DAY):
+            self.assertEqual(self.store.average(730, T, T + 120, resolution), 30)
+            self.assertEqual(self.store.peak(730, T, T + 120, resolution), 60)
+            self.assertEqual(self.store.low(730, T, T + 120, resolution), 10)
+
+    def test_same_second_counts_once(self):
+        self.assertEqual(self.store.record({730: 10, 570: 5}, ts=T), 2)
+        # a second refresh within the same second, and a duplicate inside one call
+        self.assertEqual(self.store.record({730: 1000}, ts=T), 0)
+        self.assertEqual(self.store.record([(440, 7), (440, 9)], ts=T), 1)
+        self.store.record({730: 20}, ts=T + 1)
+        samples = self.store.db.execute('SELECT appid, ts, player_count FROM samples ORDER BY appid, ts').fetchall()
+        self.assertEqual(samples, [(440, T, 7), (570, T, 5), (730, T, 10), (730, T + 1, 20)])
+        for resolution in (MINUTE, HOUR, DAY):
+            self.assertEqual(self.store.average(730, T, T + 1, resolution), 15)
+            self.assertEqual(self.store.peak(730, T, T + 1, resolution), 20)
+            self.assertEqual(self.store.average(440, T, T + 1, resolution), 7)
+
+    def test_none_counts_are_skipped(self):
+        self.assertEqual(self.store.record({730: None}, ts=T), 0)
+        self.assertIsNone(self.store.average(730, T, T, MINUTE))
+
+
+if __name__ == '__main__':
+    unittest.main()
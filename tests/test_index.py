@@ -0,0 +1,105 @@
+# substring search has to give exactly the answers of `query.lower() in name.lower()`
+import random
+import unittest
+
+from steam_core.index import IncrementalFilter, NameIndex, TrigramIndex
+
+NAMES = [
+    'Counter-Strike 2', 'Dota 2', 'Portal 2™', 'Half-Life: Alyx', 'The Witcher 3: Wild Hunt',
+    'İstanbul Drift', 'ISTANBUL drift', 'Straße der Könige', 'STRASSE', 'Ⅻ Legends',
+    'ΣΑΣ Odyssey', 'σας odyssey', 'Ǆungle Run', 'ǆungle run', 'Café Ñandú', 'CAFÉ',
+    'ﬁre ﬂy', 'Fire Fly', '東方 Project', '東方', 'Pokémon-like 🐉 Dragons', 'dragon',
+    'Dragon Quest', 'DRAGON QUEST XI', 'a', 'ab', '', '   ', 'x' * 40, 'İİİ', 'i̇i̇i̇',
+]
+QUERIES = [
+    '', 'a', 'D', '2', ' 2', 'ta', 'ota', 'dragon', 'DRAGON Q', 'quest x', 'istanbul', 'İst',
+    'i̇st', 'İ', 'i̇', 'ııı', 'straße', 'STRASSE', 'könig', 'ΣΑΣ', 'σας', 'ǆun', 'ǅun', 'café',
+    'ñandú', 'fi', 'ﬁre', '東方', '方 p', '🐉', '™', 'xxx', 'x' * 41, 'nothing here', '  ',
+]
+
+
+def expected(names, query):
+    return [i for i, name in enumerate(names) if query.lower() in name.lower()]
+
+
+class TrigramSearchTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = random.Random(3)
+        self.names = list(NAMES)
+        # plenty of names sharing trigrams, so the posting list intersection has work to do
+        words = ['dragon', 'quest', 'drift', 'İstanbul', 'straße', 'legends', 'ǆungle', 'café', '2']
+        for _ in range(500):
+            self.names.append(' '.join(rng.choice(words).title() if rng.random() < 0.5 else rng.choice(words)
+                                       for _ in range(rng.randint(1, 4))))
+        self.index = TrigramIndex(self.names)
+        self.queries = list(QUERIES)
+        # and every short slice of a sample of the names, in both cases
+        for name in rng.sample(self.names, 60):
+            for _ in range(3):
+                start = rng.randrange(max(1, len(name)))
+                query = name[start:start + rng.randint(1, 7)]
+                self.queries += [query, query.upper(), query.lower()]
+
+    def test_matches_in_operator(self):
+        for query in self.queries:
+            with self.subTest(query=query):
+                self.assertEqual(self.index.search(query), expected(self.names, query))
+
+    def test_limit_keeps_catalog_order(self):
+        for query in ('dragon', 'dr', 'ǆun'):
+            self.assertEqual(self.index.search(query, limit=5), expected(self.names, query)[:5])
+
+    def test_only_mask(self):
+        only = bytearray(i % 3 != 0 for i in range(len(self.names)))
+        for query in self.queries:
+            with self.subTest(query=query):
+                self.assertEqual(self.index.search(query, only=only),
+                                 [i for i in expected(self.names, query) if only[i]])
+
+    def test_removed_names_are_not_found(self):
+        removed = [i for i in expected(self.names, 'dragon')][::2]
+        for position in removed:
+            self.index.remove(position)
+        for query in ('dragon', 'drag', 'dr', 'on', 'Dragon Quest'):
+            with self.subTest(query=query):
+                self.assertEqual(self.index.search(query),
+                                 [i for i in expected(self.names, query) if i not in removed])
+
+    def test_incremental_filter_narrowing(self):
+        # typing letter by letter takes the narrowing path, which has to agree with a fresh search
+        incremental = IncrementalFilter(self.index)
+        for typed in ('dragon quest', 'İstanbul drift', 'straße der', 'ǅungle run', 'café ñandú'):
+            incremental.reset()
+            for length in range(1, len(typed) + 1):
+                query = typed[:length]
+                with self.subTest(query=query):
+                    self.assertEqual(incremental.search(query), expected(self.names, query))
+        # a query that does not extend the last one starts over
+        self.assertEqual(incremental.search('quest'), expected(self.names, 'quest'))
+
+    def test_incremental_filter_follows_the_mask(self):
+        incremental = IncrementalFilter(self.index)
+        only = bytearray(i % 2 for i in range(len(self.names)))
+        incremental.search('dra', only=only)
+        self.assertEqual(incremental.search('drag'), expected(self.names, 'drag'))
+        self.assertEqual(incremental.search('drago', only=only),
+                         [i for i in expected(self.names, 'drago') if only[i]])
+
+
+class NameIndexTest(unittest.TestCase):
+
+    def test_shared_names_resolve_to_the_lowest_appid(self):
+        index = NameIndex()
+        index.add(5001, 'Dragon Quest')
+        index.add(5000, 'dragon quest ')
+        index.add(7, 'Portal 2™')
+        self.assertEqual(index.lookup('DRAGON QUEST'), (5000, 5001))
+        self.assertEqual(index.find_appid('Dragon Quest'), 5000)
+        self.assertEqual(index.find_appid('portal 2'), 7)
+        index.remove(5000, 'Dragon Quest')
+        self.assertEqual(index.find_appid('Dragon Quest'), 5001)
+
+
+if __name__ == '__main__':
+    unittest.main()
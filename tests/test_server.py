@@ -0,0 +1,124 @@
+# the local proxy against a stub steam, no network needed
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.error import HTTPError
+from urllib.parse import parse_qs, urlsplit
+from urllib.request import Request, urlopen
+
+from steam_core.applist import APP_LIST_PATH
+from steam_core.players import PLAYER_COUNT_PATH
+from steam_core.server import SteamProxy, make_server
+
+APPS = [{'appid': 730, 'name': 'Counter-Strike 2'}, {'appid': 570, 'name': 'Dota 2'}]
+# appids the stub has no count for
+NO_COUNT = {570}
+ETAG = '"applist-1"'
+
+
+class StubSteam(BaseHTTPRequestHandler):
+    # counts every call so tests can see what reached "steam"
+    calls = None
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        self.calls.append(parts.path)
+        if parts.path == APP_LIST_PATH:
+            if self.headers.get('If-None-Match') == ETAG:
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send(200, {'applist': {'apps': APPS}}, ETag=ETAG)
+        elif parts.path == PLAYER_COUNT_PATH:
+            appid = int(parse_qs(parts.query)['appid'][0])
+            # slow enough for concurrent requests to overlap
+            time.sleep(0.3)
+            if appid in NO_COUNT:
+                self.send(404, {'response': {'result': 42}})
+            else:
+                self.send(200, {'response': {'player_count': appid * 10, 'result': 1}})
+        else:
+            self.send(404, {})
+
+    def send(self, status, data, **headers):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start(server):
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_address[1]}'
+
+
+class ProxyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+        stub = ThreadingHTTPServer(('127.0.0.1', 0), type('Stub', (StubSteam,), {'calls': self.calls}))
+        stub.daemon_threads = True
+        upstream = start(stub)
+        self.cache_dir = tempfile.mkdtemp()
+        proxy = SteamProxy(upstream, cache_dir=self.cache_dir)
+        server = make_server(proxy, port=0)
+        self.url = start(server)
+        for closing in (stub, server):
+            self.addCleanup(closing.server_close)
+            self.addCleanup(closing.shutdown)
+
+    def get(self, path, headers=None):
+        # (status, headers, parsed json body or None)
+        request = Request(self.url + path, headers=headers or {})
+        try:
+            with urlopen(request, timeout=10) as response:
+                body = response.read()
+                return response.status, response.headers, json.loads(body) if body else None
+        except HTTPError as e:
+            return e.code, e.headers, None
+
+    def test_concurrent_counts_share_one_upstream_call(self):
+        results = []
+
+        def ask():
+            results.append(self.get('/players?appid=730'))
+
+        threads = [threading.Thread(target=ask) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([body for _, _, body in results], [{'appid': 730, 'player_count': 7300}] * 10)
+        self.assertEqual(self.calls.count(PLAYER_COUNT_PATH), 1)
+
+    def test_no_count_answer(self):
+        status, _, body = self.get(f'{PLAYER_COUNT_PATH}?appid=570')
+        self.assertEqual(status, 200)
+        self.assertEqual(body, {'response': {'result': 42}})
+        # the answer is cached like any other
+        self.get(f'{PLAYER_COUNT_PATH}?appid=570')
+        self.assertEqual(self.calls.count(PLAYER_COUNT_PATH), 1)
+
+    def test_app_list_revalidation(self):
+        status, headers, body = self.get(APP_LIST_PATH)
+        self.assertEqual(status, 200)
+        self.assertEqual(body['applist']['apps'], APPS)
+        self.assertEqual(headers['ETag'], ETAG)
+        status, _, _ = self.get(APP_LIST_PATH, {'If-None-Match': ETAG})
+        self.assertEqual(status, 304)
+        self.assertTrue(os.path.exists(os.path.join(self.cache_dir, 'applist.json')))
+
+
+if __name__ == '__main__':
+    unittest.main()
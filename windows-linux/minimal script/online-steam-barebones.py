@@ -1,40 +1,158 @@
-import requests
-
-def find_appid(apps, name):
-    for app in apps:
-        if app['name'].lower() == name.lower():
-            return app['appid']
-    return None
-
-# get the app list once
-print("Loading list of games...")
-app_list_url = "https://api.steampowered.com/ISteamApps/GetAppList/v2/"
-app_list_response = requests.get(app_list_url)
-apps_data = app_list_response.json()
-apps = apps_data['applist']['apps']
-print("Game list loaded successfully.")
-
-while True:
-    game_name = input("\nEnter a game name (or type 'exit' to quit): ").strip()
-    if game_name.lower() == "exit":
-        break
-
-    # getting appid by app name
-    appid = find_appid(apps, game_name)
+import argparse
+import csv
+import json
+import os
+import sys
+
+# make the shared steam_core package importable when started from this folder
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+
+from steam_core import AppListCache, describe_error, fetch_player_counts, get_player_count
+from steam_core.metrics import metrics
+
+BATCH_FIELDS = ['query', 'appid', 'name', 'player_count', 'error']
+
+
+def find_appid(catalog, name):
+    return catalog.find_appid(name)
+
+
+def suggest(catalog, name, count=5):
+    # the search index is only built the first time a name is not found
+    return [catalog.name(i) for i in catalog.search_engine.search(name, limit=count)]
+
+
+def show_progress(loaded, expected):
+    print(f"\rLoading list of games... {loaded // 1000}k / ~{expected // 1000}k",
+          end='', flush=True, file=sys.stderr)
+
+
+def load_catalog():
+    # get the app list once, from the local cache when it is fresh
+    print("Loading list of games...", end='', flush=True, file=sys.stderr)
+    app_list_cache = AppListCache()
+    catalog = app_list_cache.load(on_progress=show_progress, index_substrings=False)
+    print(file=sys.stderr)
+    if app_list_cache.source == 'stale':
+        print("Steam is unreachable, using the last downloaded game list.", file=sys.stderr)
+    print("Game list loaded successfully.", file=sys.stderr)
+    return catalog
+
+
+def interactive(catalog):
+    while True:
+        game_name = input("\nEnter a game name (or type 'exit' to quit): ").strip()
+        if game_name.lower() == "exit":
+            break
+
+        # getting appid by app name
+        appid = find_appid(catalog, game_name)
+        if appid is None:
+            print("Game not found.")
+            suggestions = suggest(catalog, game_name)
+            if suggestions:
+                print("Did you mean: " + ", ".join(suggestions))
+            continue
+
+        # getting the number of players at the moment
+        try:
+            player_count = get_player_count(appid)
+
+            if player_count is not None:
+                print(f"Current number of players for {game_name}: {player_count}")
+            else:
+                print("Could not retrieve the player count. Maybe, the game isn't released")
+        except Exception as e:
+            print("An error occurred while retrieving data:", describe_error(e))
+
+
+def resolve(catalog, query):
+    # a line is either an appid or a game name, returns (appid, name as steam spells it)
+    appid = int(query) if query.isdigit() else find_appid(catalog, query)
     if appid is None:
-        print("Game not found.")
-        continue
+        return None, None
+    position = catalog.position(appid)
+    return appid, catalog.name(position) if position is not None else None
+
+
+def batch(catalog, lines, out, output_format='csv', workers=16):
+    # resolve every line, then fetch all counts at once and write each row as soon as it arrives
+    if output_format == 'csv':
+        writer = csv.DictWriter(out, fieldnames=BATCH_FIELDS)
+        writer.writeheader()
+        write_row = writer.writerow
+    else:
+        def write_row(row):
+            out.write(json.dumps(row) + '\n')
+
+    queries_by_appid = {}
+    for line in lines:
+        query = line.strip()
+        if not query or query.startswith('#'):
+            continue
+        appid, name = resolve(catalog, query)
+        if appid is None:
+            write_row({'query': query, 'appid': None, 'name': None, 'player_count': None,
+                       'error': 'not found'})
+            continue
+        queries_by_appid.setdefault(appid, []).append((query, name))
+
+    def on_result(appid, player_count, error):
+        for query, name in queries_by_appid[appid]:
+            write_row({'query': query, 'appid': appid, 'name': name, 'player_count': player_count,
+                       'error': describe_error(error) if error is not None else None})
+        out.flush()
+
+    fetch_player_counts(queries_by_appid, on_result=on_result, max_workers=workers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check how many players are online in Steam games.")
+    parser.add_argument('--batch', metavar='FILE',
+                        help="read game names or appids, one per line, from FILE ('-' for stdin) "
+                             "and print the results instead of asking interactively")
+    parser.add_argument('--format', choices=['csv', 'jsonl'], default='csv', help="batch output format")
+    parser.add_argument('--output', metavar='FILE', help="write batch results to FILE instead of stdout")
+    parser.add_argument('--workers', type=int, default=16, help="player counts fetched at the same time")
+    parser.add_argument('--metrics', metavar='FILE',
+                        help="record timings and write them to FILE when done: prometheus text "
+                             "for a .prom file, otherwise one json line appended")
+    args = parser.parse_args()
 
-    # getting the number of players at the moment
+    if args.metrics:
+        metrics.enabled = True
     try:
-        url = f"https://api.steampowered.com/ISteamUserStats/GetNumberOfCurrentPlayers/v1/?appid={appid}"
-        response = requests.get(url)
-        data = response.json()
-        player_count = data['response'].get('player_count')
-
-        if player_count is not None:
-            print(f"Current number of players for {game_name}: {player_count}")
-        else:
-            print("Could not retrieve the player count. Maybe, the game isn't released")
-    except Exception as e:
-        print("An error occurred while retrieving data:", e)
+        run(args)
+    finally:
+        if args.metrics:
+            write_metrics(args.metrics)
+
+
+def write_metrics(path):
+    if path.endswith('.prom'):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(metrics.prometheus_text())
+    else:
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(metrics.json_line() + '\n')
+
+
+def run(args):
+    catalog = load_catalog()
+    if args.batch is None:
+        interactive(catalog)
+        return
+
+    source = sys.stdin if args.batch == '-' else open(args.batch, encoding='utf-8')
+    out = open(args.output, 'w', newline='', encoding='utf-8') if args.output else sys.stdout
+    try:
+        batch(catalog, source, out, args.format, args.workers)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,157 @@
 from textual.app import App
-from textual.widgets import Static, Input, ListView, ListItem, Label, Button
+from textual.widgets import Static, Input, ListView, ListItem, Label, Button, DataTable
 from textual.containers import Container
-from textual import on
-import requests
+from textual.message import Message
+from textual import on, work
+from textual.worker import get_current_worker
 import asyncio
+import importlib
+import json
+import os
+import sys
+import time
+
+# make the shared steam_core package importable when started from this folder
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# only the cheap parts of steam_core are imported here; the networking side (and requests
+# with it) is imported by the loading thread, after the first frame is already up
+from steam_core import Catalog
+from steam_core.metrics import metrics
+from steam_core.paths import atomic_write, default_cache_dir
+
+FAVORITES_FILE = 'favorites.json'
+
+
+class ResultList(ListView):
+    # a fixed pool of rows showing a window over `items`; paging, the arrow keys at the
+    # edges and the mouse wheel move the window and only relabel the rows, so an update
+    # costs the same whether there are ten results or a hundred thousand
+
+    BINDINGS = [
+        ('pageup', 'page(-1)', 'Previous page'),
+        ('pagedown', 'page(1)', 'Next page'),
+    ]
+
+    class WindowMoved(Message):
+        def __init__(self, result_list):
+            super().__init__()
+            self.result_list = result_list
+
+    def __init__(self, rows, render, **kwargs):
+        self.labels = [Label('', markup=False) for _ in range(rows)]
+        self.rows = [ListItem(label) for label in self.labels]
+        for row in self.rows:
+            row.display = False
+        super().__init__(*self.rows, **kwargs)
+        self.render_item = render
+        self.items = []
+        self.window_start = 0
+        self.placeholder = ''
+
+    def set_items(self, items, placeholder=''):
+        # items only has to support len() and indexing, nothing is rendered past the window
+        self.items = items
+        self.placeholder = placeholder
+        self.window_start = 0
+        self.index = 0 if items else None
+        self.refresh_rows()
+
+    def scroll_window(self, start):
+        # window_start, not offset: that name belongs to Widget
+        start = max(0, min(start, len(self.items) - len(self.rows)))
+        if start != self.window_start:
+            self.window_start = start
+            self.refresh_rows()
+
+    def visible_rows(self):
+        return max(0, min(len(self.rows), len(self.items) - self.window_start))
+
+    def refresh_rows(self):
+        with metrics.timer('render_rows_seconds'):
+            self.relabel_rows()
+        self.post_message(self.WindowMoved(self))
+
+    def relabel_rows(self):
+        visible = self.visible_rows()
+        for row_index, (row, label) in enumerate(zip(self.rows, self.labels)):
+            if row_index < visible:
+                label.update(self.render_item(self.items[self.window_start + row_index]))
+                row.display = True
+                row.disabled = False
+            elif row_index == 0 and self.placeholder:
+                label.update(self.placeholder)
+                row.display = True
+                row.disabled = True
+            else:
+                row.display = False
+                row.disabled = True
+        if self.index is not None and self.index >= visible:
+            self.index = visible - 1 if visible else None
+
+    def item_for(self, row):
+        # the item a row currently shows, None for the placeholder or a hidden row
+        row_index = self.rows.index(row)
+        if row_index >= self.visible_rows():
+            return None
+        return self.items[self.window_start + row_index]
+
+    def action_cursor_down(self):
+        row_index = self.index if self.index is not None else -1
+        if row_index + 1 < self.visible_rows():
+            self.index = row_index + 1
+        else:
+            self.scroll_window(self.window_start + 1)
+
+    def action_cursor_up(self):
+        if self.index:
+            self.index -= 1
+        else:
+            self.scroll_window(self.window_start - 1)
+
+    def action_page(self, direction):
+        self.scroll_window(self.window_start + direction * len(self.rows))
+
+    def on_mouse_scroll_down(self, event):
+        event.prevent_default()
+        self.scroll_window(self.window_start + 1)
+
+    def on_mouse_scroll_up(self, event):
+        event.prevent_default()
+        self.scroll_window(self.window_start - 1)
 
 
 class OnlineSteam(App):
 
-    current_page = 0
+    BINDINGS = [
+        ('f2', 'toggle_stats', 'Stats'),
+        ('f3', 'toggle_games_only', 'Games only'),
+        ('f4', 'toggle_favorite', 'Favorite'),
+        ('f5', 'refresh_favorites', 'Refresh favorites'),
+    ]
+
     page_size = 10
+    # seconds of quiet typing before the suggestions are recomputed
+    filter_delay = 0.15
+    filter_timer = None
+    filter_query = None
+    catalog_ready = False
+    # a name submitted before the catalog finished loading, looked up as soon as it has
+    pending_lookup = None
+    stats_timer = None
+    # every hit is kept; only the first ones are ranked up front, the rest as the window
+    # moves down to them (see RankedHits), and only page_size of them are ever rendered
+    max_suggestions = None
+    # suggestions leave out soundtracks, tools, servers and the like (F3 switches)
+    games_only = True
+    app_types = None
+    # (appid, name) of the last game looked up, what F4 adds to the favorites
+    current_game = None
+    # seconds between two refreshes of all favorites
+    favorites_interval = 60
+    refreshing_favorites = False
+    # bumped by every lookup, an answer is only shown while it is still the latest one
+    lookup_serial = 0
 
     CSS = """
         #game_input {
@@ -71,51 +213,51 @@ class OnlineSteam(App):
 
         #favorites {
             border: round #55aaff;
-            padding: 1;
+            padding: 0 1;
             height: 10;
             margin-top: 1;
         }
+
+        #stats {
+            dock: bottom;
+            border: round #777777;
+            height: 12;
+            display: none;
+        }
     """
 
-    def find_appid(self, apps, name):
-        for app in apps:
-            if app['name'].lower() == name.lower():
-                return app['appid']
-        return None
+    def find_appid(self, name):
+        return self.catalog.find_appid(name)
 
     def get_games_list(self):
-        app_list_url = "https://api.steampowered.com/ISteamApps/GetAppList/v2/"
-        app_list_response = requests.get(app_list_url)
-        apps_data = app_list_response.json()
-        apps = apps_data['applist']['apps']
-        return apps
-
-    def show_page(self):
-        next_page_btn = self.query_one('#next_page_btn')
-        prvs_page_btn = self.query_one('#prvs_page_btn')
-        next_page_btn.disabled = False
-        prvs_page_btn.disabled = True
-        start = self.current_page * self.page_size
-        end = start + self.page_size
-        self.filtered_games_list.clear()
-        for app in self.filtered_apps[start:end]:
-            self.filtered_games_list.append(ListItem(Label(app['name'], markup=False)))
-        if not self.filtered_apps[start:end]:
-            self.filtered_games_list.append(ListItem(Label('No suggested games')))
-        max_page = len(self.filtered_apps) // self.page_size
-        if self.current_page >= max_page:
-            next_page_btn.disabled = True
-        if self.current_page >= 1:
-            prvs_page_btn.disabled = False
+        # served from the on-disk cache when it is fresh, revalidated otherwise,
+        # and indexed while it streams in
+        from steam_core import AppListCache
+        self.app_list_cache = AppListCache()
+        return self.app_list_cache.load(on_progress=self.report_loading)
+
+    def report_loading(self, loaded, expected):
+        # called from the loading thread
+        text = f"Loading list of games... {loaded // 1000}k / ~{expected // 1000}k"
+        self.call_from_thread(self.query_one("#loading", Static).update, text)
+
+    def game_name(self, position):
+        return self.catalog.name(position)
+
+    @on(ResultList.WindowMoved)
+    def update_page_buttons(self, event: ResultList.WindowMoved):
+        results = event.result_list
+        self.query_one('#prvs_page_btn').disabled = results.window_start == 0
+        self.query_one('#next_page_btn').disabled = results.window_start + results.visible_rows() >= len(results.items)
 
     def compose(self):
         yield Input(placeholder='Enter a game name...', id='game_input')
         yield Static("", id='loading')
         with Container(id="lists_and_output"):
             with Container(id="left_panel"):
-                filter_list_widget = ListView(id='assumed_game_list')
+                filter_list_widget = ResultList(self.page_size, self.game_name, id='assumed_game_list')
                 filter_list_widget.border_title = 'Assumed'
-                filter_list_widget.border_subtitle = 'min. 3 symbols'
+                filter_list_widget.border_subtitle = self.suggestions_subtitle()
                 yield filter_list_widget
                 with Container(id="pagination_buttons"):
                     yield Button('Previous page', id='prvs_page_btn', disabled=True)
@@ -124,73 +266,349 @@ class OnlineSteam(App):
                 output_static_widget = Static('', id='output')
                 output_static_widget.border_title = 'Output'
                 yield output_static_widget
-                favorites_widget = Static('This feature will be developed', id='favorites')
+                favorites_widget = DataTable(id='favorites', cursor_type='row')
                 favorites_widget.border_title = 'Favorites'
+                favorites_widget.border_subtitle = 'F4 add / remove, F5 refresh'
                 yield favorites_widget
+        stats_widget = Static('', id='stats', markup=False)
+        stats_widget.border_title = 'Stats (F2)'
+        yield stats_widget
+
+    def action_toggle_stats(self):
+        # timings are only collected from the moment the panel is first opened
+        # (or from the start with ONLINE_STEAM_METRICS=1)
+        stats = self.query_one('#stats', Static)
+        stats.display = not stats.display
+        if stats.display:
+            metrics.enabled = True
+            self.refresh_stats()
+            self.stats_timer = self.set_interval(1, self.refresh_stats)
+        elif self.stats_timer is not None:
+            self.stats_timer.stop()
+            self.stats_timer = None
+
+    def suggestions_subtitle(self):
+        kinds = 'games & DLC' if self.games_only else 'all apps'
+        return f'min. 3 symbols, {kinds} (F3)'
+
+    def action_toggle_games_only(self):
+        self.games_only = not self.games_only
+        self.filtered_games_list.border_subtitle = self.suggestions_subtitle()
+        if self.catalog_ready and self.filter_query is not None and len(self.filter_query) >= 3:
+            self.run_filter(self.filter_query)
+
+    def searchable_mask(self):
+        # None searches every app
+        if not self.games_only or self.app_types is None:
+            return None
+        return self.app_types.searchable_mask(self.catalog)
 
-    async def on_mount(self):
-        loading_widget = self.query_one("#loading", Static)
-        loading_widget.update("Loading list of games...")
-        self.apps = await asyncio.to_thread(self.get_games_list)
-        loading_widget.update(f"Loaded {len(self.apps)} games (and not) successfully.")
+    def refresh_stats(self):
+        lines = metrics.summary_lines()
+        self.query_one('#stats', Static).update('\n'.join(lines) or 'Nothing measured yet.')
+
+    def on_mount(self):
+        # returns right away: the screen is drawn and accepts typing while the catalog loads
+        self.catalog = Catalog()
         self.filtered_games_list = self.query_one('#assumed_game_list')
+        self.query_one("#loading", Static).update("Loading list of games...")
+        self.query_one('#game_input', Input).focus()
+        self.load_catalog()
+        self.show_favorites()
+        self.set_interval(self.favorites_interval, self.action_refresh_favorites)
+        self.action_refresh_favorites()
+
+    @property
+    def favorites_path(self):
+        return os.path.join(default_cache_dir(), FAVORITES_FILE)
+
+    def load_favorites(self):
+        # {appid: name} in the order they were added
+        try:
+            with open(self.favorites_path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            print(f"Could not read favorites: {e}")
+            return {}
+        return {int(entry['appid']): entry['name'] for entry in saved.get('favorites', [])}
+
+    def save_favorites(self):
+        data = json.dumps({'version': 1, 'favorites': [{'appid': appid, 'name': name}
+                                                       for appid, name in self.favorites.items()]})
+        try:
+            atomic_write(self.favorites_path, data)
+        except OSError as e:
+            self.query_one('#output', Static).update(f"Could not save favorites: {e}")
+
+    def show_favorites(self):
+        self.favorites = self.load_favorites()
+        # last count shown for each favorite, rows are only touched when it changes
+        self.favorite_counts = {}
+        table = self.query_one('#favorites', DataTable)
+        table.add_column('Game', key='name', width=26)
+        table.add_column('Players', key='players', width=10)
+        table.add_column('Change', key='change', width=8)
+        for appid, name in self.favorites.items():
+            table.add_row(name, '…', '', key=str(appid))
+
+    def action_toggle_favorite(self):
+        output = self.query_one('#output', Static)
+        if self.current_game is None:
+            output.update('Look up a game first, F4 then adds it to the favorites.')
+            return
+        appid, name = self.current_game
+        table = self.query_one('#favorites', DataTable)
+        if appid in self.favorites:
+            del self.favorites[appid]
+            self.favorite_counts.pop(appid, None)
+            table.remove_row(str(appid))
+            output.update(f'{name} removed from favorites.')
+        else:
+            self.favorites[appid] = name
+            table.add_row(name, '…', '', key=str(appid))
+            output.update(f'{name} added to favorites.')
+            self.run_worker(self.refresh_favorite_counts([appid]), group='favorites')
+        self.save_favorites()
+
+    def action_refresh_favorites(self):
+        # a round only starts once the previous one is done, slow rounds never pile up
+        if self.favorites and not self.refreshing_favorites:
+            self.refreshing_favorites = True
+            self.run_worker(self.refresh_favorite_counts(list(self.favorites), whole_round=True),
+                            group='favorites')
+
+    async def refresh_favorite_counts(self, appids, whole_round=False):
+        # the whole round runs on one thread, fetch_player_counts keeps a few requests in
+        # flight; each row is updated on the ui thread as its answer arrives
+        failed = []
+
+        def show(appid, player_count, error):
+            if error is not None:
+                failed.append(appid)
+            self.call_from_thread(self.show_favorite_count, appid, player_count, error)
+
+        try:
+            players = await self.players_module()
+            await asyncio.to_thread(players.fetch_player_counts, appids, on_result=show)
+        finally:
+            if whole_round:
+                self.refreshing_favorites = False
+        if whole_round:
+            status = time.strftime('updated %H:%M:%S')
+            if failed:
+                status += f', {len(failed)} not answered'
+            self.query_one('#favorites', DataTable).border_subtitle = f'{status}, F4 add / remove, F5 refresh'
+
+    async def players_module(self):
+        # brings requests along, imported off the ui thread like the catalog's
+        return await asyncio.to_thread(importlib.import_module, 'steam_core.players')
+
+    def show_favorite_count(self, appid, player_count, error):
+        # a failed lookup keeps the last count on screen
+        if error is not None or appid not in self.favorites:
+            return
+        previous = self.favorite_counts.get(appid)
+        if appid in self.favorite_counts and previous == player_count:
+            return
+        self.favorite_counts[appid] = player_count
+        table = self.query_one('#favorites', DataTable)
+        table.update_cell(str(appid), 'players', '-' if player_count is None else f'{player_count:,}')
+        change = ''
+        if previous is not None and player_count is not None:
+            change = f'{player_count - previous:+,}'
+        table.update_cell(str(appid), 'change', change)
+
+    @on(DataTable.RowSelected)
+    async def on_favorite_selected(self, event: DataTable.RowSelected):
+        # favorites are kept by appid, their saved name may be out of date after a rename
+        appid = int(event.row_key.value)
+        name = self.favorites.get(appid)
+        if name is None:
+            return
+        position = self.catalog.position(appid)
+        self.request_lookup(name if position is None else self.catalog.name(position), appid)
+
+    @work(thread=True, exclusive=True, group='catalog')
+    def load_catalog(self):
+        try:
+            catalog = self.get_games_list()
+        except Exception as e:
+            self.call_from_thread(self.catalog_failed, e)
+            return
+        try:
+            from steam_core import load_snapshot
+            _, counts = load_snapshot()
+            if counts:
+                # suggestions of the most played games first, see `python -m steam_core sweep`
+                catalog.set_popularity(counts)
+        except Exception as e:
+            print(f"Could not load player snapshot: {e}")
+        try:
+            from steam_core import AppTypes
+            self.app_types = AppTypes()
+            # built here so the first search does not pay for it
+            self.app_types.searchable_mask(catalog)
+        except Exception as e:
+            # without types every app is suggested
+            print(f"Could not load app types: {e}")
+            self.app_types = None
+        self.call_from_thread(self.catalog_loaded, catalog)
+
+    def catalog_loaded(self, catalog):
+        self.catalog = catalog
+        self.catalog_ready = True
+        source = ' (offline copy)' if self.app_list_cache.source == 'stale' else ''
+        self.query_one("#loading", Static).update(
+            f"Loaded {len(self.catalog)} games (and not) successfully{source}.")
+        # catch up with whatever was typed while loading
+        if self.filter_query is not None and len(self.filter_query) >= 3:
+            self.run_filter(self.filter_query)
+        if self.pending_lookup is not None:
+            user_game, self.pending_lookup = self.pending_lookup, None
+            self.request_lookup(user_game)
+        if self.app_types is not None and os.environ.get('STEAM_API_KEY'):
+            self.sync_types(os.environ['STEAM_API_KEY'])
+
+    @work(thread=True, exclusive=True, group='types')
+    def sync_types(self, api_key):
+        # bulk types from the store listings, at most once a day
+        from steam_core.appinfo import STORE_SYNC_INTERVAL, sync_store_types
+        try:
+            stored = sync_store_types(self.app_types, api_key, min_interval=STORE_SYNC_INTERVAL)
+        except Exception as e:
+            print(f"Could not sync app types: {type(e).__name__}")
+            return
+        if stored:
+            self.call_from_thread(self.refilter)
+
+    def catalog_failed(self, error):
+        from steam_core import describe_error
+        self.query_one("#loading", Static).update(f"Could not load list of games: {describe_error(error)}")
+        self.filtered_games_list.set_items([])
 
     @on(Input.Submitted)
     async def on_game_input_submitted(self, event: Input.Submitted):
-        output = self.query_one("#output", Static)
-        user_game = event.value
-        appid = self.find_appid(self.apps, user_game)
+        self.request_lookup(event.value)
+
+    def request_lookup(self, user_game, appid=None):
+        # exclusive: a new lookup cancels the one still waiting, so an answer for a game
+        # the user already moved away from is never shown.
+        # with an appid that app is looked up and user_game is only the name shown; without
+        # one the name is resolved, which picks the lowest appid when names are shared
+        self.lookup_serial += 1
+        self.run_worker(self.look_up(user_game, self.lookup_serial, appid), group='lookup', exclusive=True)
 
+    async def look_up(self, user_game, serial=None, appid=None):
+        output = self.query_one("#output", Static)
         if appid is None:
-            output.update(f'There is no such game with name: {user_game}.')
-            return
+            if not self.catalog_ready:
+                self.pending_lookup = user_game
+                output.update(f'Still loading the list of games, {user_game} is next.')
+                return
+            appid = self.find_appid(user_game)
+            if appid is None:
+                output.update(f'There is no such game with name: {user_game}.')
+                return
+
+        from steam_core import describe_error
+        position = self.catalog.position(appid)
+        self.current_game = (appid, user_game if position is None else self.catalog.name(position))
 
         try:
-            url = f"https://api.steampowered.com/ISteamUserStats/GetNumberOfCurrentPlayers/v1/?appid={appid}"
-            response = await asyncio.to_thread(requests.get, url)
-            data = response.json()
-            player_count = data['response'].get('player_count')
-            if player_count is not None:
-                output.update(f'{user_game} — {player_count} players online!')
+            player_count = await self.player_count(appid)
         except Exception as e:
-            output.update(f'Unexpected error: {e}')
+            if serial is None or serial == self.lookup_serial:
+                output.update(describe_error(e))
+            return
+        self.show_favorite_count(appid, player_count, None)
+        if serial is not None and serial != self.lookup_serial:
+            # superseded while waiting
+            return
+        if player_count is not None:
+            output.update(f'{user_game} — {player_count} players online!')
+        else:
+            output.update(f'Steam has no player count for {user_game}.')
+
+    async def player_count(self, appid):
+        # lookups of the same game share one request through the shared cache, which also
+        # answers them when the game was looked at a moment ago. a cancelled lookup stops
+        # waiting, the request still finishes and fills the cache
+        players = await self.players_module()
+        return await asyncio.to_thread(players.get_player_count, appid)
 
     @on(Input.Changed)
     async def filter(self, event: Input.Changed):
         query = event.value
-        if len(query) >= 3:
-            self.current_page = 0
-            self.filtered_apps = [app for app in self.apps if query.lower() in app['name'].lower()]
-            self.show_page()
+        # every keystroke restarts the countdown, only a pause in typing triggers a search
+        if self.filter_timer is not None:
+            self.filter_timer.stop()
+        self.filter_query = query
+        if len(query) < 3:
+            self.workers.cancel_group(self, 'filter')
+            self.filtered_games_list.set_items([])
+        elif not self.catalog_ready:
+            # runs once the catalog is there, see catalog_loaded
+            self.filtered_games_list.set_items([], placeholder='Loading list of games...')
         else:
-            button = self.query_one('#next_page_btn')
-            button.disabled = True
-            self.filtered_games_list.clear()
+            self.filter_timer = self.set_timer(self.filter_delay, lambda: self.run_filter(query))
+
+    @work(thread=True, exclusive=True, group='filter')
+    def run_filter(self, query):
+        # exclusive: starting a new filter cancels the one still running
+        worker = get_current_worker()
+        positions = self.catalog.search_engine.search(query, limit=self.max_suggestions,
+                                                      should_stop=lambda: worker.is_cancelled,
+                                                      only=self.searchable_mask())
+        if positions is None or worker.is_cancelled:
+            return
+        self.call_from_thread(self.show_filtered, query, positions)
+
+    def show_filtered(self, query, positions):
+        if query != self.filter_query:
+            # the user kept typing while this one was running
+            return
+        # catalog positions, names are only looked up for the visible rows
+        self.filtered_games_list.set_items(positions, placeholder='No suggested games')
+        if self.games_only and self.app_types is not None and positions:
+            self.enrich_suggestions(query, positions[:3 * self.page_size])
+
+    @work(thread=True, exclusive=True, group='enrich')
+    def enrich_suggestions(self, query, positions):
+        # asks the store for the types of the top suggestions it has not seen yet; when
+        # some of them turn out not to be games the suggestions are worked out again
+        from steam_core import enrich
+        from steam_core.appinfo import SEARCHABLE_TYPES
+        worker = get_current_worker()
+        appids = [self.catalog.appid(position) for position in positions]
+        found = enrich(self.app_types, appids, should_stop=lambda: worker.is_cancelled)
+        if any(app_type not in SEARCHABLE_TYPES + ('unknown',) for app_type in found.values()):
+            self.call_from_thread(self.refilter, query)
+
+    def refilter(self, query=None):
+        if query is None:
+            query = self.filter_query
+        if query == self.filter_query and query is not None and len(query) >= 3:
+            self.run_filter(query)
 
     @on(ListView.Selected)
     async def on_filtered_game_selected(self, event: ListView.Selected):
         if event.list_view.id != 'assumed_game_list':
             return
 
-        selected_item = event.item
-        selected_label = selected_item.query_one(Label)
-        selected_game_name = selected_label.renderable
-
-        game_input = self.query_one('#game_input', Input)
-        submit_event = Input.Submitted(game_input, selected_game_name)
-        await self.on_game_input_submitted(submit_event)
+        position = event.list_view.item_for(event.item)
+        if position is None:
+            return
+        # by appid: several apps can share the name of the row
+        self.request_lookup(self.catalog.name(position), self.catalog.appid(position))
 
     @on(Button.Pressed)
     async def on_page_button_pressed(self, event: Button.Pressed):
         if event.button.id == 'next_page_btn':
-            max_page = len(self.filtered_apps) // self.page_size
-            if self.current_page < max_page:
-                self.current_page += 1
-                self.show_page()
+            self.filtered_games_list.action_page(1)
         elif event.button.id == 'prvs_page_btn':
-            if self.current_page > 0:
-                self.current_page -= 1
-                self.show_page()
+            self.filtered_games_list.action_page(-1)
 
 
 if __name__ == '__main__':